@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.versions import (bump_version_on_commit, cache_is_shared,
+                              get_version)
+from users.models import User
+
+AUTH_CACHE_KEY = 'foodgram:auth:{}'
+# Поля пользователя, которые хранит снимок, в порядке полей модели,
+# как их ждёт from_db. Остальные, включая хэш пароля и счётчики,
+# загружаются из базы при первом обращении.
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'username', 'is_active', 'is_staff',
+                         'is_superuser')
+)
+
+
+def credentials_version(user_id):
+    return f'credentials:{user_id}'
+
+
+def credentials_changed(user_id):
+    bump_version_on_commit(credentials_version(user_id))
+
+
+class TokenCache:
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, snapshot = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+local_tokens = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TIMEOUT
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # Снимок пользователя хранится в LRU процесса и в общем кэше вместе
+    # с версией учётных данных. Выход, смена пароля и деактивация
+    # поднимают версию, и снимок перестаёт приниматься сразу во всех
+    # процессах. С кэшем в памяти процесса версия поднялась бы только
+    # в одном воркере, поэтому токен тогда проверяется по базе.
+
+    def authenticate_credentials(self, key):
+        if not cache_is_shared():
+            return super().authenticate_credentials(key)
+        cache_key = AUTH_CACHE_KEY.format(
+            hashlib.sha256(key.encode()).hexdigest()
+        )
+        snapshot = local_tokens.get(cache_key)
+        if snapshot is None:
+            snapshot = cache.get(cache_key)
+            if snapshot is not None:
+                local_tokens.set(cache_key, snapshot)
+        if snapshot is not None:
+            user_id, version, values = snapshot
+            if version == get_version(credentials_version(user_id)):
+                return self.restore(key, values)
+            local_tokens.discard(cache_key)
+        user, token = super().authenticate_credentials(key)
+        snapshot = (
+            user.id, get_version(credentials_version(user.id)),
+            tuple(getattr(user, field) for field in SNAPSHOT_FIELDS)
+        )
+        cache.set(cache_key, snapshot, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        local_tokens.set(cache_key, snapshot)
+        return user, token
+
+    def restore(self, key, values):
+        # Каждый запрос получает свой экземпляр с отложенными полями,
+        # сохранение такого экземпляра записывает только эти поля.
+        user = User.from_db(
+            router.db_for_read(User), SNAPSHOT_FIELDS, values
+        )
+        token = self.get_model()(key=key, user=user)
+        token._state.adding = False
+        return user, token
@@ -0,0 +1,58 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.http import urlencode
+
+from recipes.versions import get_version
+
+ANONYMOUS_CACHE_TIMEOUT = 60 * 60
+
+
+def anonymous_cache_key(request, view):
+    params = urlencode(sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in request.query_params.lists()
+        if any(values)
+    ), doseq=True)
+    return 'foodgram:anonymous:{}:{}:{}'.format(
+        view.basename,
+        get_version('catalog'),
+        hashlib.md5(
+            f'{request.path}?{params}:{request.accepted_renderer.format}'
+            .encode()
+        ).hexdigest()
+    )
+
+
+class AnonymousCacheMixin:
+    # Ответы анонимам одинаковы для всех, поэтому готовое тело хранится
+    # в кэше. Ключ включает версию каталога: любая правка рецептов, тэгов
+    # или профилей авторов переключает все ключи разом.
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = anonymous_cache_key(request, self)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda rendered: cache.set(
+                    key,
+                    (rendered.content, rendered['Content-Type']),
+                    ANONYMOUS_CACHE_TIMEOUT
+                )
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
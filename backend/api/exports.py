@@ -0,0 +1,91 @@
+import csv
+import json
+from itertools import islice
+
+from django.http import HttpResponse, StreamingHttpResponse
+
+from recipes.models import ShoppingListTotal
+from .offload import offload
+
+EXPORT_CHUNK_SIZE = 500
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_rows(user):
+    return ShoppingListTotal.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_txt(rows):
+    yield 'Список покупок:'
+    for name, measurement_unit, amount in rows:
+        yield f'\n{name}: {amount}, {measurement_unit}'
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for name, measurement_unit, amount in rows:
+        yield writer.writerow((name, amount, measurement_unit))
+
+
+def export_json(rows):
+    yield '['
+    separator = ''
+    for name, measurement_unit, amount in rows:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'amount': amount,
+                'measurement_unit': measurement_unit,
+            },
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+SHOPPING_CART_EXPORTS = {
+    'txt': (export_txt, 'text/plain; charset=utf-8'),
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'json': (export_json, 'application/json'),
+}
+
+
+def chunked(parts, size=EXPORT_CHUNK_SIZE):
+    parts = iter(parts)
+    chunk = ''.join(islice(parts, size))
+    while chunk:
+        yield chunk.encode()
+        chunk = ''.join(islice(parts, size))
+
+
+def render_export(export, rows):
+    return b''.join(chunked(export(rows)))
+
+
+def shopping_cart_response(user, export_format, streaming=True):
+    export, content_type = SHOPPING_CART_EXPORTS[export_format]
+    if streaming:
+        response = StreamingHttpResponse(
+            chunked(export(shopping_cart_rows(user))),
+            content_type=content_type
+        )
+    else:
+        # Под ASGI потоковое тело перебирается в цикле событий, где
+        # обращения к базе запрещены: строки выбираются заранее,
+        # а текст собирается в пуле потоков.
+        rows = list(shopping_cart_rows(user))
+        response = HttpResponse(
+            offload(render_export, export, rows), content_type=content_type
+        )
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping-list.{export_format}'
+    )
+    return response
@@ -1,6 +1,7 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
 
 
 class IngredientFilter(FilterSet):
@@ -20,6 +21,10 @@ class RecipeFilter(FilterSet):
         method="in_shopping_cart_method",
         label='Рецепты в корзине'
     )
+    search = filters.CharFilter(
+        method='search_method',
+        label='Поиск по названию, описанию и ингредиентам'
+    )
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
@@ -33,19 +38,23 @@ class RecipeFilter(FilterSet):
             'tags',
             'author',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search'
         )
 
+    def filter_memberships(self, queryset, model, value):
+        # Фильтр строится подзапросом: список id из кэша флагов
+        # у активного пользователя превратился бы в огромный IN.
+        in_list = Exists(model.objects.filter(
+            user_id=self.request.user.id, recipe_id=OuterRef('pk')
+        ))
+        return queryset.filter(in_list if value else ~in_list)
+
     def is_favorited_method(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorites__user=self.request.user)
-        return queryset.exclude(
-            favorites__user=self.request.user
-        )
+        return self.filter_memberships(queryset, Favorite, value)
 
     def in_shopping_cart_method(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_list__user=self.request.user)
-        return queryset.exclude(
-            shopping_list__user=self.request.user
-        )
+        return self.filter_memberships(queryset, ShoppingList, value)
+
+    def search_method(self, queryset, name, value):
+        return queryset.search(value)
@@ -0,0 +1,157 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+from foodgram.db.pool import pool_metrics
+
+logger = logging.getLogger(__name__)
+current_profile = ContextVar('current_profile', default=None)
+
+PLACEHOLDERS_RE = re.compile(r'%s(?:\s*,\s*%s)*')
+NUMBERS_RE = re.compile(r'\b\d+\b')
+LOGGED_DUPLICATES = 5
+
+
+def fingerprint(sql):
+    return NUMBERS_RE.sub('?', PLACEHOLDERS_RE.sub('?', sql))
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @contextmanager
+    def capture(self):
+        token = current_profile.set(self)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self))
+                yield
+        finally:
+            current_profile.reset(token)
+
+    @property
+    def duplicates(self):
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common() if count > 1
+        }
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.2f}',
+            f'queries;desc={self.queries}',
+            f'duplicates;desc={len(self.duplicates)}',
+            f'serializer;dur={self.serializer_time * 1000:.2f}',
+            f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}',
+        ))
+
+
+def timed_data(data):
+    # Время считается только у внешнего сериализатора: вложенные
+    # вызовы .data уже входят в его замер.
+    def wrapper(self):
+        profile = current_profile.get()
+        if profile is None or profile.serializer_depth:
+            return data.fget(self)
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            profile.serializer_depth -= 1
+            profile.serializer_time += time.perf_counter() - started
+
+    wrapper.profiled = True
+    return property(wrapper)
+
+
+def install_serializer_timing():
+    for serializer_class in (serializers.Serializer,
+                             serializers.ListSerializer):
+        if not getattr(serializer_class.data.fget, 'profiled', False):
+            serializer_class.data = timed_data(serializer_class.data)
+
+
+class QueryProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install_serializer_timing()
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = RequestProfile()
+        with profile.capture():
+            response = self.get_response(request)
+        if response.streaming:
+            # Запросы потоковой выгрузки выполняются при отдаче тела,
+            # заголовки к этому моменту уже отправлены.
+            response.streaming_content = self.stream(
+                profile, request, response, response.streaming_content
+            )
+            return response
+        response['Server-Timing'] = profile.server_timing()
+        self.report(profile, request, response)
+        return response
+
+    def stream(self, profile, request, response, content):
+        with profile.capture():
+            yield from content
+        self.report(profile, request, response)
+
+    def report(self, profile, request, response):
+        over_budget = profile.queries > settings.REQUEST_QUERY_BUDGET
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': profile.queries,
+            'sql_ms': round(profile.sql_time * 1000, 2),
+            'serializer_ms': round(profile.serializer_time * 1000, 2),
+            'total_ms': round(
+                (time.perf_counter() - profile.started) * 1000, 2
+            ),
+            'duplicates': dict(
+                list(profile.duplicates.items())[:LOGGED_DUPLICATES]
+            ),
+            'over_budget': over_budget,
+        }
+        pools = pool_metrics()
+        if pools:
+            record['db_connections'] = pools
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps(record, ensure_ascii=False)
+        )
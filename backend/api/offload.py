@@ -0,0 +1,60 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from drf_base64.fields import Base64ImageField
+from rest_framework import serializers
+
+from recipes.memberships import get_memberships
+
+executor = (
+    ThreadPoolExecutor(
+        max_workers=settings.OFFLOAD_WORKERS, thread_name_prefix='offload'
+    )
+    if settings.OFFLOAD_WORKERS else None
+)
+
+
+def run_detached(func, *args):
+    # Вынесенная работа не должна ходить в базу: соединение потока пула
+    # не закрывается сигналом окончания запроса.
+    try:
+        return func(*args)
+    finally:
+        for connection in connections.all():
+            if connection.connection is not None:
+                connection.close()
+
+
+def offload(func, *args):
+    # Тяжёлая работа запроса выполняется в ограниченном пуле, чтобы
+    # медленные запросы не занимали весь процессор и потоки ASGI.
+    if executor is None:
+        return func(*args)
+    context = contextvars.copy_context()
+    return executor.submit(context.run, run_detached, func, *args).result()
+
+
+class OffloadedBase64ImageField(Base64ImageField):
+
+    def to_internal_value(self, data):
+        return offload(super().to_internal_value, data)
+
+
+class OffloadedListSerializer(serializers.ListSerializer):
+
+    def serialized_data(self):
+        return super().data
+
+    @property
+    def data(self):
+        if (
+            self.instance is None
+            or len(self.instance) < settings.OFFLOAD_LIST_THRESHOLD
+        ):
+            return self.serialized_data()
+        # Страница уже получена из базы вместе с prefetch, флаги
+        # пользователя загружаются здесь же, до выноса в пул.
+        get_memberships(self.context.get('request'))
+        return offload(self.serialized_data)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.http import urlencode
+from rest_framework import exceptions, pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.models import Timeline
+from recipes.versions import get_version
+
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+class CustomPaginator(pagination.PageNumberPagination):
+    page_size_query_param = 'limit'
+
+
+class CachedCountPaginator(Paginator):
+
+    def __init__(self, *args, cache_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.cache_key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class KeysetPagination(pagination.BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return pagination.api_settings.PAGE_SIZE
+        return min(max(page_size, 1), self.max_page_size)
+
+    def position_filter(self, position):
+        condition = Q()
+        equal = {}
+        for ordering, field, value in zip(
+            self.ordering, self.fields, position
+        ):
+            lookup = 'lt' if ordering.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(token.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        values = [
+            instance._meta.get_field(field).value_to_string(instance)
+            for field in self.fields
+        ]
+        token = urlsafe_b64encode(json.dumps(values).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, token
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(position))
+        results = list(queryset[:page_size + 1])
+        self.page = results[:page_size]
+        self.has_next = len(results) > page_size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class FeedPaginator(CustomPaginator):
+    # Два режима: по умолчанию страницы с номерами и общим числом,
+    # с параметром cursor — курсор по keyset_ordering. Первая страница
+    # курсорного режима запрашивается с пустым значением (?cursor=),
+    # следующие по ссылке next. Курсор идёт только в порядке
+    # keyset_ordering, поэтому вместе с другой сортировкой или поиском
+    # он отклоняется.
+    keyset_ordering = ('-pub_date', '-id')
+    keyset_conflict_message = (
+        'Курсор листает только в порядке {}: уберите ordering и search '
+        'или используйте страницы с номерами.'
+    )
+    # Число рецептов зависит от самих рецептов и их тэгов, от slug
+    # тэгов в фильтре и от названий ингредиентов в поиске.
+    count_versions = ('recipes', 'tags', 'ingredients')
+    uncached_filters = ('is_favorited', 'is_in_shopping_cart')
+    ignored_params = ('page', 'limit', 'format')
+
+    def get_count_cache_key(self, request, view):
+        if not self.count_versions or any(
+            request.query_params.get(name) for name in self.uncached_filters
+        ):
+            return None
+        params = urlencode(sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if name not in self.ignored_params
+        ), doseq=True)
+        return 'foodgram:count:{}:{}:{}'.format(
+            getattr(view, 'basename', ''),
+            ':'.join(
+                str(get_version(name)) for name in self.count_versions
+            ),
+            hashlib.md5(params.encode()).hexdigest()
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            ordering = tuple(queryset.query.order_by)
+            if ordering != self.keyset_ordering[:len(ordering)]:
+                raise exceptions.ValidationError({
+                    KeysetPagination.cursor_query_param: (
+                        self.keyset_conflict_message.format(
+                            ', '.join(self.keyset_ordering)
+                        )
+                    )
+                })
+            self.keyset = KeysetPagination(self.keyset_ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            cache_key=self.get_count_cache_key(request, view)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class SubscriptionsPaginator(FeedPaginator):
+    keyset_ordering = ('username', 'id')
+    count_versions = ()
+
+
+class TimelinePaginator(KeysetPagination):
+    # Лента всегда листается курсором по индексу таблицы Timeline:
+    # без COUNT и OFFSET. Первая страница запрашивается без cursor,
+    # следующие по ссылке next.
+
+    def __init__(self):
+        super().__init__(('-pub_date', '-recipe_id'))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        positions = Timeline.objects.feed_page(
+            request.user.id, queryset,
+            self.decode_cursor(request, Timeline), page_size + 1
+        )
+        self.has_next = len(positions) > page_size
+        self.positions = positions[:page_size]
+        recipes = queryset.in_bulk(
+            [recipe_id for _, recipe_id in self.positions]
+        )
+        self.page = [
+            recipes[recipe_id] for _, recipe_id in self.positions
+            if recipe_id in recipes
+        ]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        pub_date, recipe_id = self.positions[-1]
+        return self.encode_cursor(
+            Timeline(pub_date=pub_date, recipe_id=recipe_id)
+        )
@@ -1,14 +1,23 @@
 import re
+from collections import Counter, defaultdict
 
 from django.core.validators import MinValueValidator
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipes.indexes import publish_recipe_ingredients
+from recipes.memberships import get_memberships
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+                            ShoppingList, ShoppingListTotal, Tag)
+from recipes.renditions import rendition_urls
 from users.models import Follow, User
-from .utils import subscribed_check, validate_create_serializer
+from .offload import OffloadedBase64ImageField, OffloadedListSerializer
+from .utils import (parse_recipes_limit, subscribed_check,
+                    validate_create_serializer)
+
+RECIPE_BATCH_LIMIT = 100
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -40,8 +49,11 @@ class CustomUserSerializer(UserSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
-            'password'
+            'password',
+            'recipes_count',
+            'followers_count'
         )
+        read_only_fields = ('recipes_count', 'followers_count')
 
     def get_is_subscribed(self, instance):
         request = self.context.get('request')
@@ -75,20 +87,18 @@ class RecipeListSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer()
     tags = TagSerializer(many=True)
     image = Base64ImageField(required=True)
+    image_renditions = serializers.SerializerMethodField()
+
+    def get_image_renditions(self, instance):
+        return rendition_urls(instance, self.context.get('request'))
 
     def get_is_favorited(self, instance):
-        request = self.context.get('request')
-        if not request:
-            return False
-        return (request.user.is_authenticated and Favorite.objects.filter(
-            user=request.user, recipe=instance
-        ).exists())
+        memberships = get_memberships(self.context.get('request'))
+        return instance.id in memberships.favorites
 
     def get_is_in_shopping_cart(self, instance):
-        request = self.context.get('request')
-        return (request.user.is_authenticated and ShoppingList.objects.filter(
-            user=request.user, recipe=instance
-        ).exists())
+        memberships = get_memberships(self.context.get('request'))
+        return instance.id in memberships.shopping_cart
 
     class Meta:
         model = Recipe
@@ -97,13 +107,27 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'author',
             'name',
             'image',
+            'image_renditions',
             'text',
             'ingredients',
             'tags',
             'cooking_time',
             'is_in_shopping_cart',
             'is_favorited',
+            'favorites_count',
         )
+        read_only_fields = ('favorites_count',)
+        list_serializer_class = OffloadedListSerializer
+
+
+class CookableRecipeSerializer(RecipeListSerializer):
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('missing_ingredients',)
+
+    def get_missing_ingredients(self, instance):
+        return self.context['missing_ingredients'].get(instance.id)
 
 
 class IngredientCreateInRecipeSerializer(serializers.ModelSerializer):
@@ -120,11 +144,11 @@ class IngredientCreateInRecipeSerializer(serializers.ModelSerializer):
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     ingredients = IngredientCreateInRecipeSerializer(many=True)
-    image = Base64ImageField()
+    image = OffloadedBase64ImageField()
     author = CustomUserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        write_only=True
     )
     cooking_time = serializers.IntegerField(
         validators=(MinValueValidator(
@@ -133,52 +157,140 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         ),)
     )
 
+    def validate_tags(self, value):
+        tags = Tag.objects.in_bulk(value)
+        missing = {
+            str(index): [f'Тэг с id={tag_id} не найден.']
+            for index, tag_id in enumerate(value) if tag_id not in tags
+        }
+        if missing:
+            raise serializers.ValidationError(missing)
+        return [tags[tag_id] for tag_id in dict.fromkeys(value)]
+
     def validate_ingredients(self, value):
         if len(value) < 1:
             raise serializers.ValidationError(
                 'Требуется не менее одного ингредиента.'
             )
-
-        existing_ingredients = []
+        counts = Counter(ingredient['id'] for ingredient in value)
+        repeated = {
+            ingredient_id for ingredient_id, count in counts.items()
+            if count > 1
+        }
+        ingredients = Ingredient.objects.in_bulk(list(counts))
+        errors = []
         for ingredient in value:
-            if ingredient in existing_ingredients:
-                raise serializers.ValidationError(
-                    'Ингредиент не может повторяться.'
-                )
-            existing_ingredients.append(ingredient)
+            if ingredient['id'] in repeated:
+                errors.append({'id': ['Ингредиент не может повторяться.']})
+            elif ingredient['id'] not in ingredients:
+                errors.append({'id': [
+                    f'Ингредиент с id={ingredient["id"]} не найден.'
+                ]})
+            else:
+                errors.append({})
+                ingredient['ingredient'] = ingredients[ingredient['id']]
+        if any(errors):
+            raise serializers.ValidationError(errors)
         return value
 
-    def recipe_ingredient_create(self, ingredients_data, recipe):
-        RecipeIngredient.objects.bulk_create(
-            [
-                RecipeIngredient(
-                    ingredient_id=ingredient['id'],
-                    amount=ingredient['amount'],
-                    recipe=recipe
-                ) for ingredient in ingredients_data
-            ]
-        )
-
+    def save_ingredients(self, recipe, ingredients_data, current_rows=()):
+        current = {row.ingredient_id: row for row in current_rows}
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        rows, created, changed = [], [], []
+        deltas = defaultdict(int)
+        for ingredient_data in ingredients_data:
+            ingredient_id = ingredient_data['id']
+            amount = ingredient_data['amount']
+            row = current.get(ingredient_id)
+            if row is None:
+                row = RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient_data['ingredient'],
+                    amount=amount
+                )
+                created.append(row)
+            elif row.amount != amount:
+                deltas[ingredient_id] -= row.amount
+                row.amount = amount
+                changed.append(row)
+            else:
+                rows.append(row)
+                continue
+            deltas[ingredient_id] += amount
+            rows.append(row)
+        removed = []
+        for ingredient_id, row in current.items():
+            if ingredient_id not in amounts:
+                removed.append(row.pk)
+                deltas[ingredient_id] -= row.amount
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.objects.bulk_create(created)
+        return rows, deltas
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
-        self.recipe_ingredient_create(ingredients_data, recipe)
+        self.saved_tags = tags
+        self.saved_rows, _ = self.save_ingredients(recipe, ingredients_data)
+        publish_recipe_ingredients(
+            recipe.id, [ingredient['id'] for ingredient in ingredients_data]
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
         ingredients_data = validated_data.pop('ingredients', None)
+        # RecipeViewSet отдаёт рецепт с предзагруженными ингредиентами.
+        current_rows = list(instance.recipe_ingredients.all())
+        rows = current_rows
         if ingredients_data is not None:
-            instance.ingredients.clear()
-        self.recipe_ingredient_create(ingredients_data, instance)
-        return super().update(instance, validated_data)
+            rows, deltas = self.save_ingredients(
+                instance, ingredients_data, current_rows
+            )
+            deltas = {
+                ingredient_id: delta
+                for ingredient_id, delta in deltas.items() if delta
+            }
+            if deltas:
+                ShoppingListTotal.objects.change_recipe(instance.id, deltas)
+        ingredients_changed = (
+            {row.ingredient_id for row in rows}
+            != {row.ingredient_id for row in current_rows}
+        )
+        if ingredients_changed:
+            publish_recipe_ingredients(
+                instance.id, [row.ingredient_id for row in rows]
+            )
+        instance = super().update(instance, validated_data)
+        if tags is not None:
+            instance.tags.set(tags)
+            self.saved_tags = tags
+        self.saved_rows = rows
+        return instance
 
     def to_representation(self, instance):
         self.fields.pop('ingredients')
         representation = super().to_representation(instance)
+        # После записи ответ строится из уже известных объектов.
+        tags = getattr(self, 'saved_tags', None)
+        if tags is None:
+            tags = instance.tags.all()
+        representation['tags'] = [tag.id for tag in tags]
+        rows = getattr(self, 'saved_rows', None)
+        if rows is None:
+            rows = instance.recipe_ingredients.select_related('ingredient')
         representation['ingredients'] = RecipeIngredientSerializer(
-            RecipeIngredient.objects.filter(recipe=instance).all(), many=True
+            rows, many=True
         ).data
         return representation
 
@@ -198,6 +310,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=True)
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -205,9 +318,13 @@ class RecipeShortSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'cooking_time',
-            'image'
+            'image',
+            'image_renditions'
         )
 
+    def get_image_renditions(self, instance):
+        return rendition_urls(instance, self.context.get('request'))
+
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     class Meta:
@@ -230,7 +347,8 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 class FollowSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
+    followers_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -243,23 +361,27 @@ class FollowSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
             'recipes',
-            'recipes_count'
+            'recipes_count',
+            'followers_count'
         )
+        list_serializer_class = OffloadedListSerializer
 
     def get_recipes(self, instance):
+        recipes = self.context.get('recipes_by_author')
+        if recipes is not None:
+            return RecipeShortSerializer(
+                recipes.get(instance.id, []), many=True
+            ).data
         request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
+        recipes_limit = parse_recipes_limit(request)
         queryset = Recipe.objects.filter(
             author__id=instance.id).order_by('-pub_date')
-        if recipes_limit:
+        if recipes_limit is not None:
             return RecipeShortSerializer(
-                queryset[:int(recipes_limit)], many=True
+                queryset[:recipes_limit], many=True
             ).data
         return RecipeShortSerializer(queryset, many=True).data
 
-    def get_recipes_count(self, instance):
-        return Recipe.objects.filter(author__id=instance.id).count()
-
     def get_is_subscribed(self, instance):
         request = self.context.get('request')
         return subscribed_check(request, instance)
@@ -331,3 +453,14 @@ class ShoppingListCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         return ShoppingList.objects.create(**validated_data)
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_LIMIT,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
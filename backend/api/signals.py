@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+from .authentication import credentials_changed
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    credentials_changed(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, update_fields, **kwargs):
+    # Смена пароля, деактивация и правка профиля меняют снимок
+    # пользователя, вход обновляет только last_login.
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        credentials_changed(instance.id)
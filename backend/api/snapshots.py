@@ -0,0 +1,60 @@
+import hashlib
+import threading
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+from recipes.versions import get_version
+from .serializers import IngredientSerializer, TagSerializer
+
+
+class CatalogSnapshot:
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def _render(self, version):
+        data = self.serializer_class(self.queryset.all(), many=True).data
+        content = JSONRenderer().render(data)
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        return version, content, etag
+
+    def get(self):
+        version = get_version(self.name)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] != version:
+                    snapshot = self._snapshot = self._render(version)
+        return snapshot
+
+
+class CatalogSnapshotMixin:
+    snapshot = None
+
+    def list(self, request, *args, **kwargs):
+        if (
+            request.accepted_renderer.format != 'json'
+            or set(request.query_params) - {'format'}
+        ):
+            return super().list(request, *args, **kwargs)
+        _, content, etag = self.snapshot.get()
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+tags_snapshot = CatalogSnapshot('tags', Tag.objects.all(), TagSerializer)
+ingredients_snapshot = CatalogSnapshot(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer
+)
@@ -1,14 +1,15 @@
+from django.core.handlers.asgi import ASGIRequest
 from rest_framework import serializers
 
-from users.models import Follow
+from recipes.memberships import get_memberships
+from recipes.models import Recipe
 
 
 def subscribed_check(request, instance):
-    if request.user.is_anonymous:
-        return False
-    return Follow.objects.filter(
-        user=request.user, author=instance
-    ).exists()
+    annotated = getattr(instance, 'is_subscribed', None)
+    if annotated is not None:
+        return annotated
+    return instance.id in get_memberships(request).following
 
 
 def validate_create_serializer(user, data, model, context):
@@ -27,3 +28,36 @@ def validate_create_serializer(user, data, model, context):
             raise serializers.ValidationError(
                 f'Рецепт не найден в объекте модели {model}.'
             )
+
+
+def recipes_by_author(author_ids, limit=None):
+    recipes = {author_id: [] for author_id in author_ids}
+    queryset = Recipe.objects.latest_by_author(
+        author_ids, limit
+    ).only(
+        'id', 'name', 'image', 'image_renditions', 'cooking_time', 'author_id'
+    )
+    for recipe in queryset.order_by('-pub_date'):
+        recipes[recipe.author_id].append(recipe)
+    return recipes
+
+
+def parse_recipes_limit(request):
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
+
+def parse_id_list(request, name):
+    ids = set()
+    for value in request.query_params.getlist(name):
+        for item in value.split(','):
+            if item.strip().isdigit():
+                ids.add(int(item))
+    return sorted(ids)
+
+
+def is_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
@@ -1,27 +1,41 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import BooleanField, F, Value
+from django.db.models.functions import Greatest
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import pagination, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+from recipes.indexes import cookable_index, ingredient_index
+from recipes.memberships import memberships_changed
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingList,
+                            ShoppingListTotal, Tag, Timeline)
+from recipes.versions import bump_version_on_commit
 from users.models import Follow, User
+from .caching import AnonymousCacheMixin
+from .exports import shopping_cart_response
 from .filters import IngredientFilter, RecipeFilter
-from .serializers import (CustomUserSerializer, FavoriteCreateSerializer,
-                          FollowCreateSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeCreateUpdateSerializer,
+from .pagination import (CustomPaginator, FeedPaginator,
+                         SubscriptionsPaginator, TimelinePaginator)
+from .renderers import SHOPPING_CART_RENDERERS
+from .serializers import (CookableRecipeSerializer, CustomUserSerializer,
+                          FavoriteCreateSerializer, FollowCreateSerializer,
+                          FollowSerializer, IngredientSerializer,
+                          RecipeBatchSerializer, RecipeCreateUpdateSerializer,
                           RecipeListSerializer, ShoppingListCreateSerializer,
                           TagSerializer)
+from .snapshots import (CatalogSnapshotMixin, ingredients_snapshot,
+                        tags_snapshot)
+from .utils import (is_asgi, parse_id_list, parse_recipes_limit,
+                    recipes_by_author)
 
-
-class CustomPaginator(pagination.PageNumberPagination):
-    page_size_query_param = 'limit'
+DEFAULT_MAX_MISSING = 3
+MAX_MISSING_LIMIT = 10
 
 
 class UserCustomViewSet(UserViewSet):
@@ -29,19 +43,39 @@ class UserCustomViewSet(UserViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPaginator
     serializer_class = CustomUserSerializer
+    filter_backends = (OrderingFilter,)
+    ordering_fields = ('username', 'recipes_count', 'followers_count')
+
+    def get_instance(self):
+        # Пользователь из снимка токена содержит только поля для
+        # проверки доступа, профиль и счётчики читаются из базы.
+        return User.objects.get(pk=self.request.user.pk)
 
     @action(
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        pagination_class=SubscriptionsPaginator
     )
     def subscriptions(self, request):
-        following_users = User.objects.filter(
+        following_users = self.filter_queryset(User.objects.filter(
             following__user=self.request.user
-        )
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ))
         paginated_queryset = self.paginate_queryset(following_users)
+        authors = (
+            paginated_queryset if paginated_queryset is not None
+            else list(following_users)
+        )
         serializer = FollowSerializer(
-            paginated_queryset,
-            context={'request': request},
+            authors,
+            context={
+                'request': request,
+                'recipes_by_author': recipes_by_author(
+                    [author.id for author in authors],
+                    parse_recipes_limit(request)
+                ),
+            },
             many=True
         )
         if paginated_queryset is not None:
@@ -54,6 +88,7 @@ class UserCustomViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,),
         serializer_class=FollowSerializer
     )
+    @transaction.atomic
     def subscribe(self, request, id):
         author = get_object_or_404(User, id=id)
         if request.method == 'POST':
@@ -66,12 +101,14 @@ class UserCustomViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save(author=author, user=self.request.user)
+            Timeline.objects.backfill(request.user.id, author.id)
             return Response(
                 serializer.data, status=status.HTTP_201_CREATED
             )
         subscription = Follow.objects.filter(user=request.user, author=author)
         if subscription.exists():
             subscription.delete()
+            Timeline.objects.prune(request.user.id, author.id)
             return Response(
                 {'message': 'Вы отписались от автора.'},
                 status=status.HTTP_204_NO_CONTENT
@@ -82,12 +119,16 @@ class UserCustomViewSet(UserViewSet):
         )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = CustomPaginator
-    filter_backends = (DjangoFilterBackend,)
+    pagination_class = FeedPaginator
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count')
+
+    def get_queryset(self):
+        return Recipe.objects.with_related()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -121,6 +162,53 @@ class RecipeViewSet(viewsets.ModelViewSet):
         model_obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def batch_recipes(self, request, model):
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        found = set(Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('id', flat=True))
+        current = model.objects.filter(
+            user=request.user, recipe_id__in=recipe_ids
+        )
+        selected = set(current.values_list('recipe_id', flat=True))
+        if request.method == 'POST':
+            changed = [
+                recipe_id for recipe_id in recipe_ids
+                if recipe_id in found and recipe_id not in selected
+            ]
+            model.objects.bulk_create(
+                [model(user=request.user, recipe_id=recipe_id)
+                 for recipe_id in changed],
+                ignore_conflicts=True
+            )
+            statuses = ('added', 'exists')
+        else:
+            changed = [
+                recipe_id for recipe_id in recipe_ids if recipe_id in selected
+            ]
+            # Один DELETE без сигналов на каждую строку, как и
+            # bulk_create: итоги и счётчики пересчитываются вызывающим
+            # действием разом для всех рецептов.
+            current._raw_delete(current.db)
+            statuses = ('removed', 'absent')
+        if changed:
+            memberships_changed(request.user.id)
+        results = [
+            {
+                'id': recipe_id,
+                'status': (
+                    'not_found' if recipe_id not in found
+                    else statuses[recipe_id not in changed]
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]
+        return changed, Response(
+            {'results': results}, status=status.HTTP_200_OK
+        )
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -138,6 +226,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['post', 'delete'],
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
             return self.add_recipe(pk, request, ShoppingListCreateSerializer)
@@ -147,42 +236,121 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        methods=['get'],
+        methods=['post', 'delete'],
+        url_path='favorite/batch',
         permission_classes=(IsAuthenticated,)
     )
-    def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_list__user=self.request.user).values(
-            'ingredient__name', 'ingredient__measurement_unit').annotate(
-            amount_of_item=Sum('amount'))
-        purchased = [
-            "Список покупок:",
-        ]
-        for item in ingredients:
-            purchased.append(
-                f"{item['ingredient__name']}: {item['amount_of_item']}, "
-                f"{item['ingredient__measurement_unit']}"
+    @transaction.atomic
+    def favorite_batch(self, request):
+        changed, response = self.batch_recipes(request, Favorite)
+        if changed:
+            # Пакетные операции не отправляют сигналы, счётчик ведём здесь.
+            Recipe.objects.filter(pk__in=changed).update(
+                favorites_count=(
+                    F('favorites_count') + 1 if request.method == 'POST'
+                    else Greatest(F('favorites_count') - 1, 0)
+                )
             )
-        purchased_file = "\n".join(purchased)
+            bump_version_on_commit('catalog')
+        return response
 
-        response = HttpResponse(purchased_file, content_type="text/plain")
-        response['Content-Disposition'] = (
-            'attachment; filename=shopping-list.txt'
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart/batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    @transaction.atomic
+    def shopping_cart_batch(self, request):
+        changed, response = self.batch_recipes(request, ShoppingList)
+        # Пакетные операции не отправляют сигналы, итоги ведём здесь.
+        ShoppingListTotal.objects.add_recipes(
+            request.user.id, changed,
+            sign=1 if request.method == 'POST' else -1
         )
         return response
 
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=TimelinePaginator
+    )
+    def feed(self, request):
+        recipes = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(recipes)
+        serializer = RecipeListSerializer(
+            page, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=CustomPaginator
+    )
+    def cookable(self, request):
+        ingredient_ids = parse_id_list(request, 'ingredients')
+        if not ingredient_ids:
+            return Response(
+                {'ingredients': 'Укажите id ингредиентов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_missing = request.query_params.get('max_missing')
+        ranked = cookable_index.rank(
+            ingredient_ids,
+            min(int(max_missing), MAX_MISSING_LIMIT)
+            if max_missing and max_missing.isdigit()
+            else DEFAULT_MAX_MISSING
+        )
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        serializer = CookableRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page
+             if recipe_id in recipes],
+            many=True,
+            context={
+                'request': request,
+                'missing_ingredients': {
+                    recipe_id: missing for recipe_id, missing, _ in page
+                },
+            }
+        )
+        return self.get_paginated_response(serializer.data)
 
-class TagViwSet(viewsets.ReadOnlyModelViewSet):
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS
+    )
+    def download_shopping_cart(self, request):
+        return shopping_cart_response(
+            request.user, request.accepted_renderer.format,
+            streaming=not is_asgi(request)
+        )
+
+
+class TagViwSet(CatalogSnapshotMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
+    snapshot = tags_snapshot
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CatalogSnapshotMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    snapshot = ingredients_snapshot
     pagination_class = None
     permission_classes = (AllowAny,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
@@ -1,7 +1,35 @@
+import asyncio
 import os
 
+from asgiref.sync import ThreadSensitiveContext
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+
+def thread_per_request(application, limit):
+    # Django 3.2 выполняет все синхронные представления в одном общем
+    # потоке. Отдельный контекст даёт каждому запросу свой поток,
+    # а семафор ограничивает число одновременно занятых потоков.
+    semaphore = None
+
+    async def wrapper(scope, receive, send):
+        nonlocal semaphore
+        if scope['type'] != 'http':
+            return await application(scope, receive, send)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit)
+        async with semaphore:
+            async with ThreadSensitiveContext():
+                return await application(scope, receive, send)
+
+    return wrapper
+
+
+application = thread_per_request(
+    django_application, settings.ASGI_MAX_CONCURRENCY
+)
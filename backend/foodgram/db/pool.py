@@ -0,0 +1,269 @@
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.utils.asyncio import async_unsafe
+
+_registry_lock = threading.Lock()
+_stats = {}
+_pools = {}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.reused = 0
+        self.health_check_failures = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    def add(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'open': self.created - self.closed,
+                'created': self.created,
+                'reused': self.reused,
+                'health_check_failures': self.health_check_failures,
+                'timeouts': self.timeouts,
+                'wait_ms': round(self.wait_time * 1000, 2),
+            }
+
+
+class ConnectionPool:
+
+    def __init__(self, size, timeout, max_lifetime, stats):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.stats = stats
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._born = {}
+        self.open = 0
+        self.waiting = 0
+
+    def expired(self, connection):
+        return self.max_lifetime is not None and (
+            time.monotonic() - self._born[connection] >= self.max_lifetime
+        )
+
+    def _take(self, deadline):
+        with self._condition:
+            while not self._idle and self.open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats.add('timeouts')
+                    raise PoolTimeout(
+                        f'Нет свободных соединений с базой за '
+                        f'{self.timeout} с, размер пула {self.size}'
+                    )
+                self.waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            if self._idle:
+                return self._idle.pop()
+            self.open += 1
+            return None
+
+    def acquire(self, connect, check):
+        started = time.monotonic()
+        try:
+            while True:
+                connection = self._take(started + self.timeout)
+                if connection is None:
+                    break
+                if self.expired(connection):
+                    self._discard(connection)
+                elif not check(connection):
+                    self.stats.add('health_check_failures')
+                    self._discard(connection)
+                else:
+                    self.stats.add('reused')
+                    return connection
+        finally:
+            self.stats.add('wait_time', time.monotonic() - started)
+        try:
+            connection = connect()
+        except Exception:
+            self._discard(None)
+            raise
+        with self._condition:
+            self._born[connection] = time.monotonic()
+        self.stats.add('created')
+        return connection
+
+    def release(self, connection, reusable):
+        with self._condition:
+            if reusable and not self.expired(connection):
+                self._idle.append(connection)
+                self._condition.notify()
+                return
+        self._discard(connection)
+
+    def _discard(self, connection):
+        with self._condition:
+            self.open -= 1
+            self._born.pop(connection, None)
+            self._condition.notify()
+        if connection is not None:
+            self.stats.add('closed')
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def clear(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+    def as_dict(self):
+        with self._condition:
+            idle = len(self._idle)
+            state = {
+                'size': self.size,
+                'in_use': self.open - idle,
+                'idle': idle,
+                'waiting': self.waiting,
+            }
+        return {**self.stats.as_dict(), **state}
+
+
+def connection_stats(alias):
+    with _registry_lock:
+        return _stats.setdefault(alias, ConnectionStats())
+
+
+def get_pool(alias, settings_dict):
+    with _registry_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                settings_dict['POOL_SIZE'],
+                settings_dict['POOL_TIMEOUT'],
+                settings_dict['CONN_MAX_AGE'],
+                _stats.setdefault(alias, ConnectionStats()),
+            )
+        return _pools[alias]
+
+
+def clear_pools():
+    # Перед fork мастер закрывает свободные соединения: сокет, общий
+    # для нескольких процессов, ломает протокол обмена с базой.
+    with _registry_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.clear()
+
+
+def pool_metrics():
+    with _registry_lock:
+        aliases = sorted(_stats)
+    return {
+        alias: (
+            _pools[alias].as_dict() if alias in _pools
+            else _stats[alias].as_dict()
+        )
+        for alias in aliases
+    }
+
+
+class PooledDatabaseWrapperMixin:
+    # Постоянные соединения для Django 3.2: проверка SELECT 1 перед
+    # повторным использованием и, при POOL_SIZE > 0, пул процесса,
+    # в который соединение возвращается в конце каждого запроса.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.settings_dict.setdefault('CONN_HEALTH_CHECKS', False)
+        self.settings_dict.setdefault('POOL_SIZE', 0)
+        self.settings_dict.setdefault('POOL_TIMEOUT', 10)
+        self.health_check_done = False
+        self.stats = connection_stats(self.alias)
+        self.pool = (
+            get_pool(self.alias, self.settings_dict)
+            if self.settings_dict['POOL_SIZE'] else None
+        )
+
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        if self.pool is None:
+            connection = connect()
+            self.stats.add('created')
+            return connection
+        try:
+            return self.pool.acquire(connect, self.check_connection)
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+
+    def connect(self):
+        # Новое соединение не проверяется: connect() сам обращается
+        # к ensure_connection при установке autocommit.
+        self.health_check_done = True
+        super().connect()
+
+    def check_connection(self, connection):
+        if not self.settings_dict['CONN_HEALTH_CHECKS']:
+            return True
+        try:
+            connection.cursor().execute('SELECT 1')
+        except self.Database.Error:
+            return False
+        return True
+
+    @async_unsafe
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            self.health_check_done = True
+            if not self.check_connection(self.connection):
+                self.stats.add('health_check_failures')
+                self.close()
+            else:
+                self.stats.add('reused')
+        super().ensure_connection()
+
+    def is_reusable(self, connection):
+        try:
+            connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return None
+        if self.pool is None:
+            self.stats.add('closed')
+            return super()._close()
+        # Соединение, закрытое внутри транзакции, остаётся у обёртки
+        # до конца atomic, поэтому в пул оно не возвращается.
+        self.pool.release(
+            self.connection,
+            not self.in_atomic_block and self.is_reusable(self.connection)
+        )
+        return None
+
+    def close_if_unusable_or_obsolete(self):
+        if self.pool is not None:
+            self.close()
+            return
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
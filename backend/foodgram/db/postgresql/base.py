@@ -0,0 +1,9 @@
+from django.db.backends.postgresql import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def check_connection(self, connection):
+        return not connection.closed and super().check_connection(connection)
@@ -14,6 +14,10 @@ DEBUG = os.getenv('DEBUG_VALUE', default='False').lower() in ('true', '1', 't')
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOST', '127.0.0.1, ').split(', ')
 
+# Режим сервера: wsgi (gunicorn с воркерами WSGI) или asgi (gunicorn
+# с воркерами uvicorn), см. gunicorn.conf.py.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi').lower()
+
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -33,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -80,12 +85,36 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Соединение живёт не дольше CONN_MAX_AGE секунд и проверяется
+        # перед повторным использованием. При POOL_SIZE > 0 соединения
+        # берутся из пула процесса и возвращаются в него после запроса:
+        # так их переиспользуют потоки gthread и ASGI.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='True'
+        ).lower() in ('true', '1', 't'),
+        'POOL_SIZE': int(
+            os.getenv('DB_POOL_SIZE', 10 if SERVER_MODE == 'asgi' else 0)
+        ),
+        'POOL_TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+}
+
+# Общий кэш нужен, чтобы версии каталога видели все воркеры. Кэш
+# в памяти процесса (LocMemCache) допустим только с одним воркером,
+# иначе gunicorn откажется стартовать, см. gunicorn.conf.py.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django_redis.cache.RedisCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://redis:6379/0'),
     }
 }
 
@@ -123,6 +152,46 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media'
 
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
+# В режиме asgi выгрузка корзины, разбор изображений и сериализация
+# больших списков выполняются в ограниченном пуле потоков.
+ASGI_MAX_CONCURRENCY = int(os.getenv('ASGI_MAX_CONCURRENCY', 32))
+OFFLOAD_WORKERS = int(
+    os.getenv('OFFLOAD_WORKERS', 4 if SERVER_MODE == 'asgi' else 0)
+)
+OFFLOAD_LIST_THRESHOLD = int(os.getenv('OFFLOAD_LIST_THRESHOLD', 30))
+
+# Рецепты авторов с большим числом подписчиков не раскладываются по лентам
+# при публикации, а подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+
+# Замер SQL и сериализации по запросам: заголовок Server-Timing и строка
+# в логе. Запросы сверх бюджета пишутся с уровнем WARNING.
+REQUEST_PROFILING = os.getenv(
+    'REQUEST_PROFILING', default='False'
+).lower() in ('true', '1', 't')
+REQUEST_PROFILING_SAMPLE_RATE = float(
+    os.getenv('REQUEST_PROFILING_SAMPLE_RATE', 1.0)
+)
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', 20))
+
+# Снимки пользователей по токенам: LRU в каждом процессе и общий кэш.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.middleware': {'handlers': ['console'], 'level': 'INFO'},
+        'foodgram.warmup': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -131,7 +200,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
@@ -0,0 +1,82 @@
+import logging
+import os
+import threading
+import time
+
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.urls import resolve
+
+from .db.pool import clear_pools
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_PATHS = ('/api/recipes/', '/api/users/', '/api/ingredients/')
+
+
+def warm_up():
+    # Каталоги, маршруты и поля сериализаторов готовятся до первого
+    # запроса. При preload это делается в мастере один раз до fork.
+    from api import serializers
+    from api.snapshots import ingredients_snapshot, tags_snapshot
+    from recipes.indexes import ingredient_index
+
+    started = time.perf_counter()
+    for path in WARM_UP_PATHS:
+        resolve(path)
+    for serializer_class in (serializers.RecipeListSerializer,
+                             serializers.RecipeCreateUpdateSerializer,
+                             serializers.CustomUserSerializer,
+                             serializers.FollowSerializer):
+        serializer_class().fields
+    try:
+        tags_snapshot.get()
+        ingredients_snapshot.get()
+        ingredient_index._ensure_fresh()
+    except Exception:
+        # База может быть ещё недоступна или не мигрирована: сервер
+        # всё равно стартует, каталоги загрузятся первым запросом.
+        logger.warning(
+            'Прогрев каталогов пропущен, база недоступна', exc_info=True
+        )
+    finally:
+        # Соединения мастера не должны достаться воркерам после fork.
+        connections.close_all()
+        clear_pools()
+    return time.perf_counter() - started
+
+
+class FirstRequestTimer:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.process_started = time.perf_counter()
+        self.request_started = None
+        self.reported = False
+
+    def start(self, **kwargs):
+        with self._lock:
+            if self.request_started is None:
+                self.request_started = time.perf_counter()
+
+    def finish(self, **kwargs):
+        with self._lock:
+            if self.reported or self.request_started is None:
+                return
+            self.reported = True
+        finished = time.perf_counter()
+        logger.info(
+            'Первый запрос процесса %s: %.1f мс, через %.2f с после старта',
+            os.getpid(),
+            (finished - self.request_started) * 1000,
+            self.request_started - self.process_started,
+        )
+        request_started.disconnect(self.start)
+        request_finished.disconnect(self.finish)
+
+
+def track_first_request():
+    timer = FirstRequestTimer()
+    request_started.connect(timer.start, weak=False)
+    request_finished.connect(timer.finish, weak=False)
+    return timer
@@ -0,0 +1,80 @@
+import os
+import time
+
+started = time.perf_counter()
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+# SERVER_MODE=asgi запускает приложение из foodgram/asgi.py воркерами
+# uvicorn, по умолчанию работают воркеры WSGI с потоками.
+server_mode = os.getenv('SERVER_MODE', 'wsgi').lower()
+cpus = available_cpus()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+# Импорт Django и разбор маршрутов выполняются один раз в мастере,
+# воркеры получают готовое приложение через fork.
+preload_app = os.getenv(
+    'GUNICORN_PRELOAD', 'True'
+).lower() in ('true', '1', 't')
+# Воркер перезапускается после заданного числа запросов, разброс
+# не даёт всем воркерам уйти на перезапуск одновременно.
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+if server_mode == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = env_int('GUNICORN_WORKERS', cpus)
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+    threads = env_int('GUNICORN_THREADS', 4)
+    worker_class = 'gthread' if threads > 1 else 'sync'
+    workers = env_int('GUNICORN_WORKERS', cpus * 2 + 1)
+
+
+def check_cache(server):
+    from recipes.versions import cache_is_shared
+
+    if server.num_workers > 1 and not cache_is_shared():
+        raise RuntimeError(
+            f'Воркеров {server.num_workers}, а кэш хранится в памяти '
+            f'процесса: версии каталога, токены и флаги пользователей '
+            f'расходились бы между воркерами. Укажите общий кэш '
+            f'(CACHE_BACKEND, CACHE_LOCATION) или GUNICORN_WORKERS=1.'
+        )
+
+
+def when_ready(server):
+    loaded = time.perf_counter() - started
+    check_cache(server)
+    if server.cfg.preload_app:
+        from foodgram.warmup import warm_up
+
+        server.log.info('Прогрев приложения: %.2f с', warm_up())
+    server.log.info(
+        'Холодный старт: %.2f с (загрузка %.2f с), воркеров %s, режим %s',
+        time.perf_counter() - started, loaded, server.num_workers,
+        server_mode
+    )
+
+
+def post_worker_init(worker):
+    from foodgram.warmup import track_first_request, warm_up
+
+    if not worker.cfg.preload_app:
+        worker.log.info('Прогрев воркера: %.2f с', warm_up())
+    track_first_request()
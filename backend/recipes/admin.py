@@ -1,7 +1,19 @@
+from collections import defaultdict
+
 from django.contrib import admin
 
+from .indexes import publish_recipe_ingredients
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingList, Tag)
+                     ShoppingList, ShoppingListTotal, Tag, Timeline)
+
+
+def ingredient_amounts(recipe):
+    amounts = defaultdict(int)
+    for ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe_id=recipe.id
+    ).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -16,9 +28,23 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     list_filter = ('name', 'author', 'tags')
     exclude = ('ingredients',)
+    readonly_fields = ('favorites_count',)
 
-    def favorites_count(self, obj):
-        return obj.favorites.count()
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        before = ingredient_amounts(recipe)
+        super().save_related(request, form, formsets, change)
+        after = ingredient_amounts(recipe)
+        # Итоги корзин, в которых лежит рецепт, меняются на разницу
+        # количеств, как и при правке рецепта через API.
+        deltas = {
+            ingredient_id: after[ingredient_id] - before[ingredient_id]
+            for ingredient_id in before.keys() | after.keys()
+            if after[ingredient_id] != before[ingredient_id]
+        }
+        if deltas:
+            ShoppingListTotal.objects.change_recipe(recipe.id, deltas)
+        publish_recipe_ingredients(recipe.id, list(after))
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -38,3 +64,5 @@ admin.site.register(Ingredient, IngredientsAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(ShoppingList)
 admin.site.register(Favorite)
+admin.site.register(ShoppingListTotal)
+admin.site.register(Timeline)
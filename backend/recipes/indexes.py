@@ -0,0 +1,424 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Ingredient, Recipe, RecipeIngredient
+from .versions import bump_version, get_version
+
+SEPARATOR = '\n'
+PREFIX_END = '\U0010ffff'
+TOKEN_RE = re.compile(r'\w+')
+# Те же веса, что у setweight A, B и C в PostgreSQL.
+SEARCH_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+COOKABLE_CHANGE_KEY = 'foodgram:cookable:change:{}'
+COOKABLE_CHANGE_TIMEOUT = 60 * 60
+COOKABLE_MAX_CHANGES = 1000
+DENSE_POSTING_RATIO = 64
+NONZERO_BYTE_RE = re.compile(rb'[^\x00]')
+
+
+def prefix_range(keys, prefix):
+    start = bisect_left(keys, prefix)
+    return start, bisect_right(keys, prefix + PREFIX_END, start)
+
+
+class VersionedIndex:
+    versions = ()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _ensure_fresh(self):
+        version = tuple(get_version(name) for name in self.versions)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build()
+                    self._version = version
+
+
+class IngredientIndex(VersionedIndex):
+    versions = ('ingredients',)
+
+    def __init__(self):
+        super().__init__()
+        # Строки, ключи, смещения и строка поиска заменяются одним
+        # присваиванием: поиск читает их без блокировки.
+        self._state = ([], [], [], '')
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].lower(), row['id'])
+        )
+        keys = [row['name'].lower() for row in rows]
+        offsets = []
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + len(SEPARATOR)
+        self._state = (rows, keys, offsets, SEPARATOR.join(keys))
+
+    @staticmethod
+    def _substring_positions(offsets, haystack, needle, exclude):
+        positions = []
+        found = haystack.find(needle)
+        while found != -1:
+            position = bisect_right(offsets, found) - 1
+            if position not in exclude:
+                positions.append(position)
+            next_key = position + 1
+            if next_key >= len(offsets):
+                break
+            found = haystack.find(needle, offsets[next_key])
+        return positions
+
+    def search(self, query):
+        query = query.strip().lower()
+        self._ensure_fresh()
+        if not query or SEPARATOR in query:
+            return []
+        rows, keys, offsets, haystack = self._state
+        start, end = prefix_range(keys, query)
+        prefix_positions = range(start, end)
+        positions = list(prefix_positions) + self._substring_positions(
+            offsets, haystack, query, prefix_positions
+        )
+        return [rows[position] for position in positions]
+
+
+class RecipeSearchIndex(VersionedIndex):
+    versions = ('recipes', 'ingredients')
+
+    def __init__(self):
+        super().__init__()
+        # Словарь и отсортированные токены заменяются вместе, как
+        # в IngredientIndex.
+        self._state = ({}, [])
+
+    def _build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+
+        def add(recipe_id, value, field):
+            for token in TOKEN_RE.findall(value.lower()):
+                postings[token][recipe_id] += SEARCH_WEIGHTS[field]
+
+        for recipe_id, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text'
+        ).iterator():
+            add(recipe_id, name, 'name')
+            add(recipe_id, text, 'text')
+        for recipe_id, name in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        ).iterator():
+            add(recipe_id, name, 'ingredients')
+        postings = {
+            token: dict(scores) for token, scores in postings.items()
+        }
+        self._state = (postings, sorted(postings))
+
+    @staticmethod
+    def _term_scores(postings, tokens, term):
+        scores = defaultdict(float)
+        start, end = prefix_range(tokens, term)
+        for token in tokens[start:end]:
+            for recipe_id, score in postings[token].items():
+                scores[recipe_id] += score
+        return scores
+
+    def search(self, query):
+        terms = TOKEN_RE.findall(query.lower())
+        self._ensure_fresh()
+        if not terms:
+            return []
+        postings, tokens = self._state
+        ranked = self._term_scores(postings, tokens, terms[0])
+        for term in terms[1:]:
+            scores = self._term_scores(postings, tokens, term)
+            ranked = {
+                recipe_id: score + scores[recipe_id]
+                for recipe_id, score in ranked.items() if recipe_id in scores
+            }
+        return sorted(ranked.items(), key=lambda item: (-item[1], -item[0]))
+
+
+def bitmap_positions(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for match in NONZERO_BYTE_RE.finditer(data):
+        byte = data[match.start()]
+        base = match.start() * 8
+        while byte:
+            low = byte & -byte
+            yield base + low.bit_length() - 1
+            byte ^= low
+
+
+def add_bitmap(planes, bitmap):
+    carry = bitmap
+    for position, plane in enumerate(planes):
+        planes[position], carry = plane ^ carry, plane & carry
+        if not carry:
+            return
+    planes.append(carry)
+
+
+def planes_equal(planes, value, everything):
+    if value >> len(planes):
+        return 0
+    result = everything
+    for bit, plane in enumerate(planes):
+        result &= plane if value >> bit & 1 else ~plane
+    return result
+
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+class CookableRanking:
+    # Ленивый результат ранжирования для пагинатора: корзины
+    # (недостаёт, размер рецепта) уже упорядочены, внутри корзины
+    # рецепты идут от новых к старым, поэтому страницу можно снять
+    # со старших битов без сортировки всех кандидатов.
+
+    def __init__(self, recipe_ids, buckets):
+        self._recipe_ids = recipe_ids
+        self._buckets = buckets
+        self._length = None
+
+    def __len__(self):
+        if self._length is None:
+            found = 0
+            for _, _, bitmap in self._buckets:
+                found |= bitmap
+            self._length = popcount(found)
+        return self._length
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, _ = item.indices(len(self))
+        skip, wanted = start, stop - start
+        page = []
+        for missing, size, bitmap in self._buckets:
+            if len(page) >= wanted:
+                break
+            if skip:
+                count = popcount(bitmap)
+                if skip >= count:
+                    skip -= count
+                    continue
+            while bitmap and len(page) < wanted:
+                position = bitmap.bit_length() - 1
+                bitmap ^= 1 << position
+                if skip:
+                    skip -= 1
+                    continue
+                page.append(
+                    (self._recipe_ids[position], missing, size - missing)
+                )
+        return page
+
+
+class CookableIndex:
+    # Рецептам выдаются плотные номера позиций в порядке id. Для каждого
+    # ингредиента хранится отсортированный массив позиций, а для
+    # популярных ещё и битовая карта. Совпадения считаются побитовыми
+    # слоями сразу по всем рецептам операциями над длинными целыми.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self.load(())
+
+    def load(self, pairs):
+        ingredients_by_recipe = defaultdict(list)
+        for recipe_id, ingredient_id in pairs:
+            ingredients_by_recipe[recipe_id].append(ingredient_id)
+        self._recipes = {}
+        self._positions = {}
+        self._recipe_ids = array('q')
+        self._postings = defaultdict(lambda: array('l'))
+        for recipe_id in sorted(ingredients_by_recipe):
+            position = len(self._recipe_ids)
+            ingredient_ids = frozenset(ingredients_by_recipe[recipe_id])
+            self._recipe_ids.append(recipe_id)
+            self._positions[recipe_id] = position
+            self._recipes[recipe_id] = ingredient_ids
+            for ingredient_id in ingredient_ids:
+                self._postings[ingredient_id].append(position)
+        sizes = defaultdict(lambda: bytearray(len(self._recipe_ids) // 8 + 1))
+        for recipe_id, ingredient_ids in self._recipes.items():
+            position = self._positions[recipe_id]
+            sizes[len(ingredient_ids)][position >> 3] |= 1 << (position & 7)
+        self._sizes = {
+            size: int.from_bytes(data, 'little')
+            for size, data in sizes.items()
+        }
+        self._bitmaps = {
+            ingredient_id: self._to_bitmap(posting)
+            for ingredient_id, posting in self._postings.items()
+            if len(posting) * DENSE_POSTING_RATIO > len(self._recipe_ids)
+        }
+
+    def _to_bitmap(self, posting):
+        data = bytearray(len(self._recipe_ids) // 8 + 1)
+        for position in posting:
+            data[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(data, 'little')
+
+    def _bitmap(self, ingredient_id):
+        bitmap = self._bitmaps.get(ingredient_id)
+        if bitmap is None:
+            posting = self._postings.get(ingredient_id)
+            bitmap = self._to_bitmap(posting) if posting else 0
+        return bitmap
+
+    def _move_size(self, position, old, new):
+        mask = 1 << position
+        if old:
+            self._sizes[old] &= ~mask
+            if not self._sizes[old]:
+                del self._sizes[old]
+        if new:
+            self._sizes[new] = self._sizes.get(new, 0) | mask
+
+    def apply(self, recipe_id, ingredient_ids):
+        old = self._recipes.pop(recipe_id, frozenset())
+        new = frozenset(ingredient_ids or ())
+        position = self._positions.get(recipe_id)
+        if position is None:
+            if not new:
+                return
+            position = self._positions[recipe_id] = len(self._recipe_ids)
+            self._recipe_ids.append(recipe_id)
+        for ingredient_id in old - new:
+            posting = self._postings[ingredient_id]
+            index = bisect_left(posting, position)
+            if index < len(posting) and posting[index] == position:
+                del posting[index]
+            if ingredient_id in self._bitmaps:
+                self._bitmaps[ingredient_id] &= ~(1 << position)
+        for ingredient_id in new - old:
+            insort(self._postings[ingredient_id], position)
+            if ingredient_id in self._bitmaps:
+                self._bitmaps[ingredient_id] |= 1 << position
+        self._move_size(position, len(old), len(new))
+        if new:
+            self._recipes[recipe_id] = new
+        else:
+            del self._positions[recipe_id]
+            # Выданные ранее CookableRanking читают массив без блокировки,
+            # поэтому позиция обнуляется в копии.
+            recipe_ids = array('q', self._recipe_ids)
+            recipe_ids[position] = 0
+            self._recipe_ids = recipe_ids
+
+    def _build(self):
+        self.load(RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by().iterator())
+
+    def _catch_up(self, version):
+        if (
+            self._version is None
+            or not 0 < version - self._version <= COOKABLE_MAX_CHANGES
+        ):
+            return False
+        keys = [
+            COOKABLE_CHANGE_KEY.format(number)
+            for number in range(self._version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for key in keys:
+            self.apply(*changes[key])
+        return True
+
+    def _ensure_fresh(self):
+        version = get_version('cookable')
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            if not self._catch_up(version):
+                self._build()
+            self._version = version
+
+    def containing_all(self, ingredient_ids):
+        self._ensure_fresh()
+        with self._lock:
+            bitmaps = [
+                self._bitmap(ingredient_id)
+                for ingredient_id in set(ingredient_ids)
+            ]
+            if not bitmaps:
+                return []
+            common = bitmaps[0]
+            for bitmap in bitmaps[1:]:
+                common &= bitmap
+            return sorted(
+                self._recipe_ids[position]
+                for position in bitmap_positions(common)
+            )
+
+    def rank(self, ingredient_ids, max_missing):
+        self._ensure_fresh()
+        # apply() меняет словари и массивы на месте, поэтому ранжирование
+        # идёт под той же блокировкой. Операции над длинными целыми всё
+        # равно держат GIL, параллельности потоков это не отнимает.
+        with self._lock:
+            return self._rank(ingredient_ids, max_missing)
+
+    def _rank(self, ingredient_ids, max_missing):
+        everything = (1 << len(self._recipe_ids)) - 1
+        hit_planes = []
+        for ingredient_id in set(ingredient_ids):
+            add_bitmap(hit_planes, self._bitmap(ingredient_id))
+        with_hits = {}
+        buckets = []
+        for missing in range(max_missing + 1):
+            for size in sorted(self._sizes, reverse=True):
+                hits = size - missing
+                if hits < 1:
+                    break
+                if hits not in with_hits:
+                    with_hits[hits] = planes_equal(
+                        hit_planes, hits, everything
+                    )
+                bitmap = self._sizes[size] & with_hits[hits]
+                if bitmap:
+                    buckets.append((missing, size, bitmap))
+        return CookableRanking(self._recipe_ids, buckets)
+
+
+def publish_recipe_ingredients(recipe_id, ingredient_ids):
+    change = (recipe_id, tuple(ingredient_ids or ()))
+
+    def publish():
+        version = bump_version('cookable')
+        cache.set(
+            COOKABLE_CHANGE_KEY.format(version), change,
+            COOKABLE_CHANGE_TIMEOUT
+        )
+
+    transaction.on_commit(publish)
+
+
+ingredient_index = IngredientIndex()
+recipe_search_index = RecipeSearchIndex()
+cookable_index = CookableIndex()
@@ -0,0 +1,265 @@
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+from .benchmark_cookable import percentile
+from .generate_dataset import PASSWORD, USERNAME_PREFIX
+
+QUERIES_RE = re.compile(r'(?:^|,)\s*queries;desc="?(\d+)')
+FLOWS = {
+    'feed': lambda sample: '/api/recipes/feed/',
+    'recipes': lambda sample: (
+        f'/api/recipes/?page={sample.rng.randint(1, 20)}'
+    ),
+    'recipe_detail': lambda sample: (
+        f'/api/recipes/{sample.rng.choice(sample.recipe_ids)}/'
+    ),
+    'subscriptions': lambda sample: (
+        '/api/users/subscriptions/?recipes_limit=3'
+    ),
+    'download_shopping_cart': lambda sample: (
+        '/api/recipes/download_shopping_cart/'
+    ),
+    'ingredients': lambda sample: (
+        f'/api/ingredients/?name={sample.rng.choice(sample.prefixes)}'
+    ),
+    'recipes_large': lambda sample: (
+        f'/api/recipes/?limit=100&page={sample.rng.randint(1, 5)}'
+    ),
+}
+# Смешанный сценарий для сравнения режимов WSGI и ASGI: медленные
+# запросы не должны задерживать быстрые.
+MIXED_FLOW = 'mixed'
+MIXED_SLOW = ('download_shopping_cart', 'recipes_large')
+MIXED_FAST = ('recipe_detail', 'ingredients')
+
+
+class Sample:
+
+    def __init__(self, seed, recipe_ids, prefixes):
+        self.rng = random.Random(seed)
+        self.recipe_ids = recipe_ids
+        self.prefixes = prefixes
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон основных сценариев API параллельными '
+            'клиентами с сохранением результатов для сравнения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Сколько сгенерированных пользователей использовать'
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Число запросов на сценарий'
+        )
+        parser.add_argument(
+            '--flow', action='append', dest='flows',
+            choices=[*FLOWS, MIXED_FLOW],
+            help='Сценарий (можно указать несколько раз), по умолчанию все'
+        )
+        parser.add_argument(
+            '--slow-ratio', type=float, default=0.2,
+            help='Доля медленных запросов в смешанном сценарии'
+        )
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов, по умолчанию benchmark_api_<время>'
+        )
+        parser.add_argument(
+            '--compare', help='Файл результатов предыдущего прогона'
+        )
+
+    def handle(self, *args, **kwargs):
+        self.base_url = kwargs['base_url'].rstrip('/')
+        self.timeout = kwargs['timeout']
+        self.local = threading.local()
+        self.tokens = self.login(kwargs['users'])
+        sample = self.load_sample(kwargs['seed'])
+        results = {}
+        for flow in kwargs['flows'] or [*FLOWS, MIXED_FLOW]:
+            paths = self.build_paths(
+                flow, sample, kwargs['requests'], kwargs['slow_ratio']
+            )
+            results[flow] = self.run_flow(paths, kwargs['concurrency'])
+            self.report(flow, results[flow])
+        output = kwargs['output'] or (
+            f'benchmark_api_{datetime.now():%Y%m%d_%H%M%S}.json'
+        )
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'base_url': self.base_url,
+                    'concurrency': kwargs['concurrency'],
+                    'requests': kwargs['requests'],
+                    'started_at': datetime.now().isoformat(),
+                    'flows': results,
+                },
+                file, ensure_ascii=False, indent=2
+            )
+        self.stdout.write(f'Результаты сохранены в {output}')
+        if kwargs['compare']:
+            self.compare(kwargs['compare'], results)
+
+    @property
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def login(self, count):
+        emails = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('id').values_list('email', flat=True)[:count]
+        tokens = []
+        for email in emails:
+            response = self.session.post(
+                f'{self.base_url}/api/auth/token/login/',
+                json={'email': email, 'password': PASSWORD},
+                timeout=self.timeout
+            )
+            if response.ok:
+                tokens.append(response.json()['auth_token'])
+        if not tokens:
+            raise CommandError(
+                'Не удалось войти ни одним пользователем, сначала '
+                'выполните python manage.py generate_dataset'
+            )
+        return tokens
+
+    def load_sample(self, seed):
+        recipes = self.session.get(
+            f'{self.base_url}/api/recipes/?limit=100', timeout=self.timeout
+        ).json()['results']
+        ingredients = self.session.get(
+            f'{self.base_url}/api/ingredients/', timeout=self.timeout
+        ).json()
+        return Sample(
+            seed,
+            [recipe['id'] for recipe in recipes],
+            sorted({ingredient['name'][:2] for ingredient in ingredients})
+        )
+
+    def request(self, path):
+        started = time.perf_counter()
+        try:
+            response = self.session.get(
+                f'{self.base_url}{path}',
+                headers={
+                    'Authorization': f'Token {random.choice(self.tokens)}'
+                },
+                timeout=self.timeout
+            )
+            ok = response.ok
+            match = QUERIES_RE.search(
+                response.headers.get('Server-Timing', '')
+            )
+        except requests.RequestException:
+            ok, match = False, None
+        return (
+            (time.perf_counter() - started) * 1000,
+            ok,
+            int(match.group(1)) if match else None,
+        )
+
+    def build_paths(self, flow, sample, count, slow_ratio):
+        if flow != MIXED_FLOW:
+            return [(FLOWS[flow](sample), None) for _ in range(count)]
+        paths = []
+        for _ in range(count):
+            group = 'slow' if sample.rng.random() < slow_ratio else 'fast'
+            name = sample.rng.choice(
+                MIXED_SLOW if group == 'slow' else MIXED_FAST
+            )
+            paths.append((FLOWS[name](sample), group))
+        return paths
+
+    def run_flow(self, paths, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            measurements = list(executor.map(
+                self.request, [path for path, _ in paths]
+            ))
+        elapsed = time.perf_counter() - started
+        timings = [timing for timing, _, _ in measurements]
+        queries = [
+            number for _, _, number in measurements if number is not None
+        ]
+        groups = {}
+        for (_, group), (timing, _, _) in zip(paths, measurements):
+            if group is not None:
+                groups.setdefault(group, []).append(timing)
+        count = len(paths)
+        return {
+            'requests': count,
+            'errors': sum(not ok for _, ok, _ in measurements),
+            'throughput_rps': round(count / elapsed, 2),
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'queries_mean': (
+                round(statistics.mean(queries), 2) if queries else None
+            ),
+            'queries_max': max(queries) if queries else None,
+            **{
+                f'{group}_p{int(share * 100)}_ms': round(
+                    percentile(group_timings, share), 2
+                )
+                for group, group_timings in sorted(groups.items())
+                for share in (0.5, 0.95)
+            },
+        }
+
+    def report(self, flow, result):
+        queries = (
+            f'запросов к БД {result["queries_mean"]} '
+            f'(макс. {result["queries_max"]})'
+            if result['queries_mean'] is not None
+            else 'запросы к БД не измерены (нет заголовка Server-Timing)'
+        )
+        groups = ''.join(
+            f', {group}: p50 {result[f"{group}_p50_ms"]} мс, '
+            f'p95 {result[f"{group}_p95_ms"]} мс'
+            for group in ('fast', 'slow') if f'{group}_p95_ms' in result
+        )
+        self.stdout.write(
+            f'{flow}: {result["throughput_rps"]} rps, '
+            f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+            f'p99 {result["p99_ms"]} мс, ошибок {result["errors"]}, '
+            f'{queries}{groups}'
+        )
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)['flows']
+        self.stdout.write(f'Сравнение с {path}:')
+        for flow, result in results.items():
+            before = previous.get(flow)
+            if before is None:
+                continue
+            fast = (
+                f', быстрые p95 {before["fast_p95_ms"]} → '
+                f'{result["fast_p95_ms"]} мс'
+                if 'fast_p95_ms' in before and 'fast_p95_ms' in result
+                else ''
+            )
+            self.stdout.write(
+                f'{flow}: p95 {before["p95_ms"]} → {result["p95_ms"]} мс, '
+                f'{before["throughput_rps"]} → {result["throughput_rps"]} rps'
+                f'{fast}'
+            )
@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.indexes import CookableIndex
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Замер скорости поиска «что приготовить из этих ингредиентов» '
+            'на синтетическом наборе рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--ingredients', type=int, default=2_200)
+        parser.add_argument('--queries', type=int, default=1_000)
+        parser.add_argument('--query-size', type=int, default=8)
+        parser.add_argument('--max-missing', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=9)
+        parser.add_argument(
+            '--target-ms', type=float, default=20.0,
+            help='Допустимое время p95 одного запроса, мс'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(kwargs['seed'])
+        ingredient_ids = range(1, kwargs['ingredients'] + 1)
+        # Популярность ингредиентов распределена по закону Ципфа.
+        weights = [1 / rank for rank in ingredient_ids]
+        pairs = []
+        for recipe_id in range(1, kwargs['recipes'] + 1):
+            size = rng.randint(3, 15)
+            for ingredient_id in set(
+                rng.choices(ingredient_ids, weights, k=size)
+            ):
+                pairs.append((recipe_id, ingredient_id))
+
+        index = CookableIndex()
+        started = time.perf_counter()
+        index.load(pairs)
+        build_time = time.perf_counter() - started
+        index._ensure_fresh = lambda: None
+
+        timings = []
+        for _ in range(kwargs['queries']):
+            query = rng.choices(
+                ingredient_ids, weights, k=kwargs['query_size']
+            )
+            started = time.perf_counter()
+            ranking = index.rank(query, kwargs['max_missing'])
+            # Как в API: общее число найденных и первая страница.
+            len(ranking)
+            ranking[:kwargs['page_size']]
+            timings.append((time.perf_counter() - started) * 1000)
+
+        p95 = percentile(timings, 0.95)
+        self.stdout.write(
+            f'Рецептов {kwargs["recipes"]}, связей {len(pairs)}, '
+            f'построение индекса {build_time:.2f} с\n'
+            f'p50 {statistics.median(timings):.2f} мс, '
+            f'p95 {p95:.2f} мс, p99 {percentile(timings, 0.99):.2f} мс, '
+            f'max {max(timings):.2f} мс'
+        )
+        if p95 > kwargs['target_ms']:
+            self.stderr.write(
+                f'p95 превышает цель {kwargs["target_ms"]} мс'
+            )
+            raise SystemExit(1)
@@ -0,0 +1,265 @@
+import io
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag)
+from recipes.versions import bump_version_on_commit
+from users.models import Follow, User
+
+USERNAME_PREFIX = 'bench_'
+EMAIL_TEMPLATE = USERNAME_PREFIX + '{}@example.com'
+PASSWORD = 'benchmark-password'
+IMAGE_NAME = 'recipes/benchmark.jpg'
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+# Популярность авторов и рецептов распределена по закону Ципфа,
+# число подписок пользователя — по Парето.
+ZIPF_EXPONENT = 1.1
+PARETO_ALPHA = 2.0
+
+
+def zipf_weights(size):
+    return [1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(size)]
+
+
+def sample_distinct(rng, population, weights, count, exclude=None):
+    chosen = set()
+    for _ in range(4):
+        missing = count - len(chosen)
+        if missing <= 0:
+            break
+        chosen.update(rng.choices(population, weights, k=missing * 2))
+        chosen.discard(exclude)
+    return list(chosen)[:count]
+
+
+@contextmanager
+def explicit_pub_date():
+    # auto_now_add перезаписывает дату при bulk_create, а рецептам нужна
+    # дата публикации, растянутая во времени.
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетического набора данных для нагрузочного '
+            'тестирования: пользователи, подписки, рецепты, избранное '
+            'и корзины')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=15,
+            help='Среднее число рецептов в избранном пользователя'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее число рецептов в корзине пользователя'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=2_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее сгенерированные данные перед генерацией'
+        )
+
+    def handle(self, *args, **kwargs):
+        self.rng = random.Random(kwargs['seed'])
+        self.batch_size = kwargs['batch_size']
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты: '
+                'python manage.py load_ingredients'
+            )
+        generated = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if kwargs['clear']:
+            deleted, _ = generated.delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        elif generated.exists():
+            raise CommandError(
+                'Набор уже сгенерирован, используйте --clear для пересоздания'
+            )
+        started = time.perf_counter()
+        with transaction.atomic():
+            tag_ids = self.ensure_tags()
+            user_ids = self.create_users(kwargs['users'])
+            follows = self.create_follows(user_ids, kwargs['follows'])
+            recipe_ids = self.create_recipes(
+                user_ids, kwargs['recipes'], kwargs['days']
+            )
+            links = self.create_recipe_links(
+                recipe_ids, ingredient_ids, tag_ids
+            )
+            favorites = self.create_memberships(
+                Favorite, user_ids, recipe_ids, kwargs['favorites']
+            )
+            carts = self.create_memberships(
+                ShoppingList, user_ids, recipe_ids, kwargs['cart']
+            )
+            # bulk_create не отправляет сигналы.
+            bump_version_on_commit('recipes')
+            bump_version_on_commit('cookable')
+            bump_version_on_commit('catalog')
+        self.stdout.write(
+            f'Пользователей {len(user_ids)}, подписок {follows}, '
+            f'рецептов {len(recipe_ids)}, связей с ингредиентами {links}, '
+            f'избранного {favorites}, корзин {carts} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
+        for command in ('reconcile_counters', 'rebuild_shopping_totals',
+                        'rebuild_timelines', 'update_search_vectors'):
+            call_command(command, stdout=self.stdout)
+
+    def ensure_tags(self):
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if tag_ids:
+            return tag_ids
+        return [
+            Tag.objects.create(name=name, color=color, slug=slug).id
+            for name, color, slug in DEFAULT_TAGS
+        ]
+
+    def ensure_image(self):
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = io.BytesIO()
+            Image.new('RGB', (1280, 960), '#E26C2D').save(buffer, 'JPEG')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'{USERNAME_PREFIX}{number}',
+                    email=EMAIL_TEMPLATE.format(number),
+                    first_name='Тест',
+                    last_name=f'Пользователь {number}',
+                    password=password,
+                )
+                for number in range(count)
+            ],
+            batch_size=self.batch_size
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).values_list('id', flat=True))
+        self.rng.shuffle(user_ids)
+        return user_ids
+
+    def create_follows(self, user_ids, mean):
+        weights = zipf_weights(len(user_ids))
+        scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+        follows = []
+        for user_id in user_ids:
+            count = min(
+                len(user_ids) - 1,
+                int(self.rng.paretovariate(PARETO_ALPHA) * scale)
+            )
+            follows.extend(
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in sample_distinct(
+                    self.rng, user_ids, weights, count, exclude=user_id
+                )
+            )
+        Follow.objects.bulk_create(follows, batch_size=self.batch_size)
+        return len(follows)
+
+    def create_recipes(self, user_ids, count, days):
+        image = self.ensure_image()
+        authors = self.rng.choices(
+            user_ids, zipf_weights(len(user_ids)), k=count
+        )
+        now = timezone.now()
+        step = timedelta(days=days) / max(count, 1)
+        with explicit_pub_date():
+            Recipe.objects.bulk_create(
+                [
+                    Recipe(
+                        name=f'Рецепт {number}',
+                        author_id=author_id,
+                        image=image,
+                        text=f'Описание рецепта {number}.',
+                        cooking_time=self.rng.randint(5, 180),
+                        pub_date=now - step * (count - number),
+                    )
+                    for number, author_id in enumerate(authors)
+                ],
+                batch_size=self.batch_size
+            )
+        return list(Recipe.objects.filter(
+            author__username__startswith=USERNAME_PREFIX
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipe_links(self, recipe_ids, ingredient_ids, tag_ids):
+        weights = zipf_weights(len(ingredient_ids))
+        ingredients, tags = [], []
+        for recipe_id in recipe_ids:
+            ingredients.extend(
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+                for ingredient_id in sample_distinct(
+                    self.rng, ingredient_ids, weights,
+                    self.rng.randint(3, 15)
+                )
+            )
+            tags.extend(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, min(3, len(tag_ids)))
+                )
+            )
+        RecipeIngredient.objects.bulk_create(
+            ingredients, batch_size=self.batch_size
+        )
+        Recipe.tags.through.objects.bulk_create(
+            tags, batch_size=self.batch_size
+        )
+        return len(ingredients)
+
+    def create_memberships(self, model, user_ids, recipe_ids, mean):
+        # Новые рецепты популярнее старых.
+        weights = zipf_weights(len(recipe_ids))
+        newest_first = recipe_ids[::-1]
+        rows = []
+        for user_id in user_ids:
+            rows.extend(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in sample_distinct(
+                    self.rng, newest_first, weights,
+                    min(len(recipe_ids), int(self.rng.expovariate(1 / mean)))
+                )
+            )
+        model.objects.bulk_create(
+            rows, batch_size=self.batch_size, ignore_conflicts=True
+        )
+        return len(rows)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.renditions import generate_renditions, is_stale
+
+
+class Command(BaseCommand):
+    help = 'Подготовка уменьшенных копий изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии для всех рецептов'
+        )
+
+    def handle(self, *args, **kwargs):
+        generated = failed = 0
+        recipes = Recipe.objects.only('image', 'image_renditions')
+        for recipe in recipes.iterator():
+            if not kwargs['all'] and not is_stale(recipe):
+                continue
+            try:
+                generate_renditions(recipe.id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+            else:
+                generated += 1
+        self.stdout.write(
+            f'Копии подготовлены: {generated}, ошибок: {failed}'
+        )
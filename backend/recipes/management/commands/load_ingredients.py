@@ -1,31 +1,132 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.versions import bump_version_on_commit
+
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+        else:
+            yield None
+
+
+def read_json(file):
+    for item in json.load(file):
+        try:
+            yield item['name'], item['measurement_unit']
+        except (KeyError, TypeError):
+            yield None
+
+
+READERS = {'csv': read_csv, 'json': read_json}
 
 
 class Command(BaseCommand):
-    help = 'Загрузка данных из csv файла в БД'
+    help = 'Загрузка ингредиентов из csv или json файла в БД'
 
     def add_arguments(self, parser):
-        parser.add_argument('--path', type=str, help='Путь к файлу')
+        parser.add_argument(
+            '--path', type=str, default='data/',
+            help='Путь к файлу или к каталогу с файлом ingredients'
+        )
+        parser.add_argument(
+            '--format', choices=READERS, help='Формат файла'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только проверить файл, ничего не записывая'
+        )
+
+    def get_source(self, path, file_format):
+        if os.path.isdir(path):
+            path = os.path.join(path, f'ingredients.{file_format or "csv"}')
+        if file_format is None:
+            file_format = os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
+        return path, file_format
+
+    def clean_rows(self, rows, stats):
+        seen = set()
+        for row in rows:
+            stats['read'] += 1
+            if row is None:
+                stats['invalid'] += 1
+                continue
+            name, measurement_unit = (str(value).strip() for value in row)
+            if (
+                not name or not measurement_unit
+                or len(name) > NAME_MAX_LENGTH
+                or len(measurement_unit) > UNIT_MAX_LENGTH
+            ):
+                stats['invalid'] += 1
+                continue
+            if (name, measurement_unit) in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add((name, measurement_unit))
+            yield Ingredient(name=name, measurement_unit=measurement_unit)
+
+    def load(self, ingredients, batch_size):
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            batch = list(islice(ingredients, batch_size))
+            while batch:
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = list(islice(ingredients, batch_size))
+            created = Ingredient.objects.count() - before
+            if created:
+                bump_version_on_commit('ingredients')
+        return created
+
+    def dry_run(self, ingredients):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        return sum(
+            (ingredient.name, ingredient.measurement_unit) not in existing
+            for ingredient in ingredients
+        )
 
     def handle(self, *args, **kwargs):
-        file_path = kwargs['path'] + 'ingredients.csv'
-        with open(
-                file_path, 'r',
-                encoding='UTF-8'
-        ) as ingredients:
-            reader = csv.reader(ingredients)
-
-            for row in reader:
-                try:
-                    obj, created = Ingredient.objects.get_or_create(
-                        name=row[0], measurement_unit=row[1],
-                    )
-                    if not created:
-                        print('Ошибка заполнения базы данных ингредиентами')
-                except Exception as error:
-                    print(f'Ошибка заполнения {row}. {error}.')
-        print('Данные загружены')
+        path, file_format = self.get_source(kwargs['path'], kwargs['format'])
+        stats = dict.fromkeys(('read', 'invalid', 'duplicates'), 0)
+        started = time.perf_counter()
+        with open(path, 'r', encoding='UTF-8') as file:
+            ingredients = self.clean_rows(READERS[file_format](file), stats)
+            if kwargs['dry_run']:
+                created = self.dry_run(ingredients)
+            else:
+                created = self.load(ingredients, kwargs['batch_size'])
+        elapsed = time.perf_counter() - started
+        valid = stats['read'] - stats['invalid'] - stats['duplicates']
+        action, result = (
+            ('Проверка', 'будет добавлено') if kwargs['dry_run']
+            else ('Загрузка', 'добавлено')
+        )
+        self.stdout.write(
+            f'{action} {path}: '
+            f'прочитано {stats["read"]}, {result} {created}, '
+            f'уже в БД {valid - created}, '
+            f'повторов в файле {stats["duplicates"]}, '
+            f'ошибочных строк {stats["invalid"]}, '
+            f'время {elapsed:.2f} с'
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListTotal
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт итогов списков покупок по корзинам пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя (можно указать несколько раз)'
+        )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            totals = ShoppingListTotal.objects.rebuild(kwargs['users'])
+        self.stdout.write(f'Итоги пересчитаны: {len(totals)} строк')
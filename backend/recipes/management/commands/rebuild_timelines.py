@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересборка лент подписок по подпискам пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя (можно указать несколько раз)'
+        )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            entries = Timeline.objects.rebuild(kwargs['users'])
+        self.stdout.write(f'Ленты пересобраны: {len(entries)} записей')
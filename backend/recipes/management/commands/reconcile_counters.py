@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from recipes.versions import bump_version_on_commit
+from users.models import Follow, User
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(
+                **{field: models.OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=models.Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def reconcile(model, counter, related_model, field):
+    actual = f'actual_{counter}'
+    drifted = model.objects.annotate(
+        **{actual: count_subquery(related_model, field)}
+    ).exclude(**{counter: models.F(actual)})
+    return drifted.update(**{counter: count_subquery(related_model, field)})
+
+
+class Command(BaseCommand):
+    help = 'Сверка и исправление счётчиков избранного, рецептов и подписчиков'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            results = (
+                ('Recipe.favorites_count',
+                 reconcile(Recipe, 'favorites_count', Favorite, 'recipe')),
+                ('User.recipes_count',
+                 reconcile(User, 'recipes_count', Recipe, 'author')),
+                ('User.followers_count',
+                 reconcile(User, 'followers_count', Follow, 'author')),
+            )
+            if any(fixed for _, fixed in results):
+                # Счётчики выводятся в кэшированных ответах анонимам.
+                bump_version_on_commit('catalog')
+        for counter, fixed in results:
+            self.stdout.write(f'{counter}: исправлено {fixed}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт поисковых векторов рецептов (PostgreSQL)'
+
+    def handle(self, *args, **kwargs):
+        updated = Recipe.objects.all().update_search_vector()
+        self.stdout.write(f'Обновлено рецептов: {updated}')
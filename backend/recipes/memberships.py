@@ -0,0 +1,70 @@
+from array import array
+
+from django.core.cache import cache
+from django.db import connection
+
+from users.models import Follow
+from .models import Favorite, ShoppingList
+from .versions import bump_version_on_commit, cache_is_shared, get_version
+
+MEMBERSHIPS_KEY = 'foodgram:memberships:{}:{}'
+MEMBERSHIPS_TIMEOUT = 24 * 60 * 60
+
+
+def memberships_version(user_id):
+    return f'memberships:{user_id}'
+
+
+class Memberships:
+    __slots__ = ('favorites', 'shopping_cart', 'following')
+
+    def __init__(self, favorites=(), shopping_cart=(), following=()):
+        self.favorites = frozenset(favorites)
+        self.shopping_cart = frozenset(shopping_cart)
+        self.following = frozenset(following)
+
+
+EMPTY_MEMBERSHIPS = Memberships()
+
+
+def read_memberships(user_id):
+    return (
+        array('q', Favorite.objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True).order_by()),
+        array('q', ShoppingList.objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True).order_by()),
+        array('q', Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True).order_by()),
+    )
+
+
+def load_memberships(user_id):
+    # Внутри транзакции версия ещё не поднята, а кэш может хранить
+    # состояние до записи, поэтому читаем напрямую из базы. Кэш
+    # в памяти процесса не узнал бы об изменениях в других воркерах.
+    if connection.in_atomic_block or not cache_is_shared():
+        return Memberships(*read_memberships(user_id))
+    key = MEMBERSHIPS_KEY.format(
+        user_id, get_version(memberships_version(user_id))
+    )
+    packed = cache.get(key)
+    if packed is None:
+        packed = read_memberships(user_id)
+        cache.set(key, packed, MEMBERSHIPS_TIMEOUT)
+    return Memberships(*packed)
+
+
+def get_memberships(request):
+    if request is None or request.user.is_anonymous:
+        return EMPTY_MEMBERSHIPS
+    memberships = getattr(request, 'memberships', None)
+    if memberships is None:
+        memberships = request.memberships = load_memberships(request.user.id)
+    return memberships
+
+
+def memberships_changed(user_id):
+    bump_version_on_commit(memberships_version(user_id))
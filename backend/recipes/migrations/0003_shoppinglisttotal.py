@@ -0,0 +1,64 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_list_totals(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListTotal = apps.get_model('recipes', 'ShoppingListTotal')
+    ShoppingListTotal.objects.bulk_create(
+        [
+            ShoppingListTotal(
+                user_id=row['recipe__shopping_list__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['total'],
+            )
+            for row in RecipeIngredient.objects.filter(
+                recipe__shopping_list__isnull=False
+            ).values(
+                'recipe__shopping_list__user', 'ingredient'
+            ).annotate(total=models.Sum('amount')).order_by()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddField(
+            model_name='shoppinglisttotal',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_totals', to='recipes.ingredient', verbose_name='Ингредиент'),
+        ),
+        migrations.AddField(
+            model_name='shoppinglisttotal',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_totals', to=settings.AUTH_USER_MODEL, verbose_name='Покупатель'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglisttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_total'),
+        ),
+        migrations.RunPython(
+            fill_shopping_list_totals, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_feed_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Уменьшенные копии изображения'),
+        ),
+    ]
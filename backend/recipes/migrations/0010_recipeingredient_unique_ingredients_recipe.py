@@ -0,0 +1,50 @@
+# Generated by Django 3.2.3 on 2026-10-17 07:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Предел PositiveSmallIntegerField в PostgreSQL.
+MAX_AMOUNT = 32767
+
+
+def merge_duplicates(apps, schema_editor):
+    # Модель уже требовала уникальности и непустого рецепта, а база нет:
+    # повторы одного ингредиента в рецепте сливаются в одну строку
+    # с суммой количества, строки корзины без рецепта удаляются.
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    ShoppingList.objects.filter(recipe__isnull=True).delete()
+    duplicates = RecipeIngredient.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        rows=models.Count('id'),
+        keep=models.Min('id'),
+        total=models.Sum('amount'),
+    ).filter(rows__gt=1).order_by()
+    for row in duplicates:
+        RecipeIngredient.objects.filter(pk=row['keep']).update(
+            amount=min(row['total'], MAX_AMOUNT)
+        )
+        RecipeIngredient.objects.filter(
+            recipe=row['recipe'], ingredient=row['ingredient']
+        ).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to='recipes.recipe', verbose_name='Рецепт к покупке'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'recipe'), name='unique_ingredients_recipe'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.3 on 2026-10-17 09:05
+
+from django.db import migrations, models
+
+
+def fill_pub_dates(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Timeline = apps.get_model('recipes', 'Timeline')
+    Timeline.objects.update(pub_date=models.Subquery(
+        Recipe.objects.filter(
+            pk=models.OuterRef('recipe_id')
+        ).values('pub_date')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipeingredient_unique_ingredients_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeline',
+            name='pub_date',
+            field=models.DateTimeField(null=True, verbose_name='Дата публикации'),
+        ),
+        migrations.RunPython(fill_pub_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timeline',
+            name='pub_date',
+            field=models.DateTimeField(verbose_name='Дата публикации'),
+        ),
+        migrations.AddIndex(
+            model_name='timeline',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='timeline_user_feed_idx'),
+        ),
+    ]
@@ -1,9 +1,20 @@
+import heapq
+from collections import defaultdict
 from typing import Optional
 
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MinValueValidator, validate_slug
-from django.db import models
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
 
-from users.models import User
+from users.models import Follow, User
+
+SEARCH_CONFIG = 'russian'
+SEARCH_RESULTS_LIMIT = 1000
 
 
 class Tag(models.Model):
@@ -54,6 +65,12 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_unit'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,15 +78,75 @@ class Ingredient(models.Model):
 
 class RecipeQuerySet(models.QuerySet):
 
-    def add_user_annotations(self, user_id: Optional[int]):
-        return self.annotate(
-            is_favorited=models.Exists(
-                Favorite.objects.filter(
-                    user_id=user_id, recipe__pk=models.OuterRef('pk')
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            models.Prefetch('tags', queryset=Tag.objects.all()),
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
                 )
             ),
         )
 
+    def latest_by_author(self, author_ids, limit: Optional[int] = None):
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return queryset
+        ranked = queryset.annotate(
+            recipe_rank=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=models.F('pub_date').desc(),
+            )
+        ).order_by().values('pk', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) AS ranked '
+            f'WHERE ranked.recipe_rank <= %s',
+            (*params, limit)
+        ))
+
+    def update_search_vector(self):
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        ingredient_names = models.Subquery(
+            RecipeIngredient.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                names=StringAgg('ingredient__name', ' ')
+            ).values('names')
+        )
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Coalesce(ingredient_names, models.Value('')),
+                weight='B', config=SEARCH_CONFIG
+            )
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+
+    def search(self, query):
+        if connections[self.db].vendor == 'postgresql':
+            search_query = SearchQuery(
+                query, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return self.filter(search_vector=search_query).annotate(
+                search_rank=SearchRank(
+                    models.F('search_vector'), search_query
+                )
+            ).order_by('-search_rank', '-pub_date', '-id')
+        from .indexes import recipe_search_index
+        ranked = recipe_search_index.search(query)[:SEARCH_RESULTS_LIMIT]
+        if not ranked:
+            return self.none()
+        return self.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+            search_rank=models.Case(
+                *(models.When(pk=pk, then=score) for pk, score in ranked),
+                output_field=models.FloatField()
+            )
+        ).order_by('-search_rank', '-pub_date', '-id')
+
 
 class Recipe(models.Model):
 
@@ -92,6 +169,11 @@ class Recipe(models.Model):
         blank=False,
         help_text='Прикрепите изображение',
     )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         blank=False,
@@ -127,13 +209,27 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        db_index=True,
+    )
 
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_feed_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -226,3 +322,260 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'Избранный рецепт пользователя {self.user}'
+
+
+class ShoppingListTotalQuerySet(models.QuerySet):
+
+    def add_amounts(self, user_ids, amounts):
+        user_ids = list(user_ids)
+        if not user_ids or not amounts:
+            return
+        self.bulk_create(
+            [
+                ShoppingListTotal(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=0
+                )
+                for user_id in user_ids
+                for ingredient_id, delta in amounts.items() if delta > 0
+            ],
+            ignore_conflicts=True
+        )
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in amounts.items() if delta
+        }
+        if not deltas:
+            return
+        # Все изменения одним UPDATE: приращение выбирается по ингредиенту.
+        self.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        ).update(amount=models.F('amount') + models.Case(
+            *[
+                models.When(ingredient_id=ingredient_id, then=delta)
+                for ingredient_id, delta in deltas.items()
+            ],
+            output_field=models.IntegerField()
+        ))
+        if any(delta < 0 for delta in deltas.values()):
+            self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+    def add_recipes(self, user_id, recipe_ids, sign=1):
+        amounts = defaultdict(int)
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] += sign * amount
+        self.add_amounts([user_id], amounts)
+
+    def change_recipe(self, recipe_id, amounts):
+        self.add_amounts(
+            ShoppingList.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('user_id', flat=True),
+            amounts
+        )
+
+    def rebuild(self, user_ids=None):
+        # Условия на корзину задаются одним filter(): второй вызов по
+        # многозначной связи добавил бы своё соединение и умножил суммы.
+        conditions = {'recipe__shopping_list__isnull': False}
+        totals = self.all()
+        if user_ids is not None:
+            conditions['recipe__shopping_list__user_id__in'] = user_ids
+            totals = totals.filter(user_id__in=user_ids)
+        carts = RecipeIngredient.objects.filter(**conditions)
+        totals.delete()
+        return self.bulk_create(
+            [
+                ShoppingListTotal(
+                    user_id=row['recipe__shopping_list__user'],
+                    ingredient_id=row['ingredient'],
+                    amount=row['total'],
+                )
+                for row in carts.values(
+                    'recipe__shopping_list__user', 'ingredient'
+                ).annotate(total=models.Sum('amount')).order_by()
+            ],
+            batch_size=1000
+        )
+
+
+class ShoppingListTotal(models.Model):
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_totals',
+        verbose_name='Покупатель',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingListTotalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_total'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient}: {self.amount}'
+
+
+class TimelineQuerySet(models.QuerySet):
+
+    def add_entries(self, rows):
+        return self.bulk_create(
+            [
+                Timeline(user_id=user_id, recipe_id=recipe_id,
+                         author_id=author_id, pub_date=pub_date)
+                for user_id, recipe_id, author_id, pub_date in rows
+            ],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def entries_for(self, follows):
+        return follows.filter(
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+            author__recipes__isnull=False
+        ).values_list(
+            'user_id', 'author__recipes', 'author_id',
+            'author__recipes__pub_date'
+        ).order_by()
+
+    def fan_out(self, recipe):
+        return self.add_entries(
+            (user_id, recipe.id, recipe.author_id, recipe.pub_date)
+            for user_id in Follow.objects.filter(
+                author_id=recipe.author_id,
+                author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+            ).values_list('user_id', flat=True)
+        )
+
+    def backfill(self, user_id, author_id):
+        return self.add_entries(self.entries_for(
+            Follow.objects.filter(user_id=user_id, author_id=author_id)
+        ))
+
+    def prune(self, user_id, author_id):
+        self.filter(user_id=user_id, author_id=author_id).delete()
+        if User.objects.filter(
+            pk=author_id, followers_count=settings.FEED_FANOUT_LIMIT
+        ).exists():
+            # Автор перестал быть «тяжёлым»: его рецепты больше не
+            # подмешиваются при чтении, поэтому раскладываем их по лентам.
+            self.add_entries(self.entries_for(
+                Follow.objects.filter(author_id=author_id)
+            ))
+
+    def rebuild(self, user_ids=None):
+        follows = Follow.objects.all()
+        entries = self.all()
+        if user_ids is not None:
+            follows = follows.filter(user_id__in=user_ids)
+            entries = entries.filter(user_id__in=user_ids)
+        entries.delete()
+        return self.add_entries(self.entries_for(follows))
+
+    def feed_page(self, user_id, recipes, position, limit):
+        # Страница ленты по ключу (pub_date, id) от новых к старым. Записи
+        # читаются по индексу (user, -pub_date, -recipe), рецепты
+        # «тяжёлых» авторов подмешиваются отдельным запросом с тем же
+        # порядком, оба запроса ограничены размером страницы.
+        entries = self.filter(user_id=user_id)
+        if recipes.query.has_filters():
+            entries = entries.filter(recipe__in=recipes.values('id'))
+        sources = [(entries, 'recipe_id')]
+        heavy_authors = list(Follow.objects.filter(
+            user_id=user_id,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('author_id', flat=True))
+        if heavy_authors:
+            sources.append(
+                (recipes.filter(author_id__in=heavy_authors), 'id')
+            )
+        pages = []
+        for queryset, id_field in sources:
+            if position is not None:
+                pub_date, recipe_id = position
+                queryset = queryset.filter(
+                    models.Q(pub_date__lt=pub_date)
+                    | models.Q(pub_date=pub_date,
+                               **{f'{id_field}__lt': recipe_id})
+                )
+            pages.append(list(queryset.order_by(
+                '-pub_date', f'-{id_field}'
+            ).values_list('pub_date', id_field)[:limit]))
+        # Запись автора, ставшего «тяжёлым», может прийти из обоих
+        # источников, повторы в слиянии идут подряд.
+        merged = []
+        for key in heapq.merge(*pages, reverse=True):
+            if not merged or merged[-1] != key:
+                merged.append(key)
+        return merged[:limit]
+
+
+class Timeline(models.Model):
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    # Копия даты публикации рецепта: лента сортируется по индексу
+    # таблицы без соединения с рецептами.
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+    )
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_feed_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
@@ -0,0 +1,113 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .versions import bump_version
+
+RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+RENDITION_QUALITY = 82
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='renditions'
+)
+
+
+def rendition_name(image_name, kind):
+    base, _ = os.path.splitext(os.path.basename(image_name))
+    return f'recipes/renditions/{kind}/{base}.jpg'
+
+
+def is_stale(recipe):
+    return bool(recipe.image) and (
+        recipe.image_renditions.get('source') != recipe.image.name
+    )
+
+
+def to_rgb(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_renditions(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return None
+    source = recipe.image.name
+    with recipe.image.open('rb') as image_file:
+        image = to_rgb(Image.open(image_file))
+    renditions = {'source': source}
+    for kind, size in RENDITIONS.items():
+        rendition = image.copy()
+        rendition.thumbnail(size, Image.LANCZOS)
+        buffer = BytesIO()
+        rendition.save(
+            buffer, 'JPEG',
+            quality=RENDITION_QUALITY, optimize=True, progressive=True
+        )
+        name = rendition_name(source, kind)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        renditions[kind] = default_storage.save(
+            name, ContentFile(buffer.getvalue())
+        )
+    # Если изображение успели заменить, копии старого не сохраняем.
+    if Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_renditions=renditions
+    ):
+        bump_version('catalog')
+    return renditions
+
+
+def run_in_background(recipe_id):
+    try:
+        generate_renditions(recipe_id)
+    except Exception:
+        logger.exception('Не удалось подготовить копии изображения рецепта '
+                         '%s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    if is_stale(recipe):
+        recipe_id = recipe.id
+        transaction.on_commit(
+            lambda: executor.submit(run_in_background, recipe_id)
+        )
+
+
+def rendition_urls(recipe, request=None):
+    if not recipe.image:
+        return None
+    renditions = recipe.image_renditions
+    fresh = renditions.get('source') == recipe.image.name
+    urls = {}
+    for kind in RENDITIONS:
+        url = (
+            default_storage.url(renditions[kind])
+            if fresh and kind in renditions else recipe.image.url
+        )
+        urls[kind] = request.build_absolute_uri(url) if request else url
+    return urls
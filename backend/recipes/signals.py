@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from users.models import User
+from .indexes import publish_recipe_ingredients
+from .memberships import memberships_changed
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingList, ShoppingListTotal, Tag, Timeline)
+from .renditions import schedule_renditions
+from .versions import bump_version_on_commit
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_version_on_commit('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    bump_version_on_commit('tags')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def catalog_changed(**kwargs):
+    bump_version_on_commit('catalog')
+
+
+def refresh_search_vectors(recipes):
+    # Вектор пересчитывается после коммита, когда записаны все
+    # ингредиенты рецепта, в том числе через bulk_create.
+    transaction.on_commit(recipes.update_search_vector)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_text_saved(instance, update_fields, **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        refresh_search_vectors(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    refresh_search_vectors(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        refresh_search_vectors(Recipe.objects.filter(
+            recipe_ingredients__ingredient_id=instance.id
+        ))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingList)
+def recipe_memberships_changed(instance, **kwargs):
+    memberships_changed(instance.user_id)
+
+
+# Счётчики меняются через update() без сигналов модели, а попадают
+# в кэшированные ответы анонимам, поэтому версия каталога
+# поднимается здесь.
+@receiver(post_save, sender=Favorite)
+def favorite_created(instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+        bump_version_on_commit('catalog')
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        favorites_count=Greatest(F('favorites_count') - 1, 0)
+    )
+    bump_version_on_commit('catalog')
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_created(instance, created, **kwargs):
+    if created:
+        ShoppingListTotal.objects.add_recipes(
+            instance.user_id, [instance.recipe_id]
+        )
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_deleted(instance, **kwargs):
+    # Приходит и при каскадном удалении рецепта или его автора: Django
+    # отправляет pre_delete строк корзины раньше, чем удалит рецепт
+    # и его ингредиенты, поэтому итоги вычитаются здесь, один раз.
+    ShoppingListTotal.objects.add_recipes(
+        instance.user_id, [instance.recipe_id], sign=-1
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(action, **kwargs):
+    # Тэги меняют состав отфильтрованных списков, а с ним и их число.
+    if action.startswith('post_'):
+        bump_version_on_commit('recipes')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, **kwargs):
+    bump_version_on_commit('recipes')
+    schedule_renditions(instance)
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+        Timeline.objects.fan_out(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    bump_version_on_commit('recipes')
+    publish_recipe_ingredients(instance.id, None)
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=Greatest(F('recipes_count') - 1, 0)
+    )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_KEY = 'foodgram:version:{}'
+
+
+def _initial_version():
+    # После сброса кэша версия не должна совпасть ни с одной из прежних.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+
+
+def bump_version_on_commit(name):
+    transaction.on_commit(lambda: bump_version(name))
+
+
+def cache_is_shared():
+    # Версии, поднятые в одном процессе, должны видеть все остальные.
+    # Кэш в памяти процесса этого не обеспечивает.
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
@@ -0,0 +1,112 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings, tmp_path):
+    # Тесты идут в одном процессе, общий кэш им не нужен.
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    settings.MEDIA_ROOT = tmp_path
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    # Файловый кэш общий для процессов и проходит cache_is_shared().
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path / 'cache'),
+        }
+    }
+
+
+def make_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@foodgram.ru',
+        password='Pa55word!',
+        first_name=username.title(),
+        last_name='Тестов',
+    )
+
+
+@pytest.fixture
+def author(db):
+    return make_user('author')
+
+
+@pytest.fixture
+def user(db):
+    return make_user('user')
+
+
+@pytest.fixture
+def token(user):
+    return Token.objects.create(user=user)
+
+
+@pytest.fixture
+def user_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=name, color=color, slug=slug)
+        for name, color, slug in (
+            ('Завтрак', '#E26C2D', 'breakfast'),
+            ('Обед', '#49B64E', 'lunch'),
+        )
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return Ingredient.objects.bulk_create([
+        Ingredient(name=name, measurement_unit='г')
+        for name in ('мука', 'молоко', 'яйца', 'сахар', 'соль', 'масло')
+    ])
+
+
+@pytest.fixture
+def make_recipes(author, tags, ingredients):
+    def make(count, author=author):
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}',
+                text='Смешать и запечь.',
+                cooking_time=10 + number,
+                image='recipes/images/test.png',
+            )
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in ingredients[:3 + number % 3]
+            ])
+            recipes.append(recipe)
+        return recipes
+    return make
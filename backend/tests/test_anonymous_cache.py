@@ -0,0 +1,44 @@
+import pytest
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def anonymous_detail(client, recipe):
+    return client.get(f'/api/recipes/{recipe.id}/').json()
+
+
+def anonymous_ordered(client):
+    return [
+        recipe['favorites_count'] for recipe in client.get(
+            '/api/recipes/', {'ordering': 'favorites_count'}
+        ).json()['results']
+    ]
+
+
+def test_favorite_refreshes_anonymous_responses(anonymous_client,
+                                                user_client, make_recipes):
+    recipe, = make_recipes(1)
+    assert anonymous_detail(anonymous_client, recipe)['favorites_count'] == 0
+    user_client.post(f'/api/recipes/{recipe.id}/favorite/')
+    assert anonymous_detail(anonymous_client, recipe)['favorites_count'] == 1
+    user_client.delete(f'/api/recipes/{recipe.id}/favorite/')
+    assert anonymous_detail(anonymous_client, recipe)['favorites_count'] == 0
+    assert anonymous_ordered(anonymous_client) == [0]
+    user_client.post(
+        '/api/recipes/favorite/batch/', {'recipes': [recipe.id]},
+        format='json'
+    )
+    assert anonymous_ordered(anonymous_client) == [1]
+
+
+def test_follow_refreshes_anonymous_responses(anonymous_client, user_client,
+                                              make_recipes):
+    recipe, = make_recipes(1)
+    author = anonymous_detail(anonymous_client, recipe)['author']
+    assert author['followers_count'] == 0
+    user_client.post(f'/api/users/{recipe.author_id}/subscribe/')
+    author = anonymous_detail(anonymous_client, recipe)['author']
+    assert author['followers_count'] == 1
+    user_client.delete(f'/api/users/{recipe.author_id}/subscribe/')
+    author = anonymous_detail(anonymous_client, recipe)['author']
+    assert author['followers_count'] == 0
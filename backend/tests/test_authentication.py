@@ -0,0 +1,124 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication, TokenCache
+from users.models import User
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def local_tokens(monkeypatch):
+    tokens = TokenCache(size=100, timeout=300)
+    monkeypatch.setattr('api.authentication.local_tokens', tokens)
+    return tokens
+
+
+def authenticate(key):
+    with CaptureQueriesContext(connection) as context:
+        user, token = CachedTokenAuthentication().authenticate_credentials(
+            key
+        )
+    return user, len(context)
+
+
+def test_token_cache_evicts_least_recently_used():
+    tokens = TokenCache(size=2, timeout=300)
+    tokens.set('a', 1)
+    tokens.set('b', 2)
+    assert tokens.get('a') == 1
+    tokens.set('c', 3)
+    assert tokens.get('b') is None
+    assert (tokens.get('a'), tokens.get('c')) == (1, 3)
+    tokens.discard('a')
+    assert tokens.get('a') is None
+
+
+def test_token_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('api.authentication.time.monotonic', lambda: now[0])
+    tokens = TokenCache(size=10, timeout=30)
+    tokens.set('a', 1)
+    now[0] += 29
+    assert tokens.get('a') == 1
+    now[0] += 2
+    assert tokens.get('a') is None
+
+
+def test_shared_cache_skips_database(shared_cache, user, token):
+    assert authenticate(token.key) == (user, 1)
+    assert authenticate(token.key) == (user, 0)
+
+
+def test_snapshot_is_restored_from_shared_cache(
+    shared_cache, user, token, local_tokens
+):
+    authenticate(token.key)
+    # Другой процесс: своего LRU у него нет, снимок берётся из кэша.
+    local_tokens._entries.clear()
+    cached_user, queries = authenticate(token.key)
+    assert (cached_user, queries) == (user, 0)
+    assert cached_user.username == user.username
+    assert authenticate(token.key)[0] is not cached_user
+
+
+def test_snapshot_keeps_only_access_fields(shared_cache, user, token,
+                                           local_tokens):
+    authenticate(token.key)
+    (_, snapshot), = local_tokens._entries.values()
+    assert user.password not in repr(snapshot)
+    cached_user = authenticate(token.key)[0]
+    assert cached_user.get_deferred_fields() >= {
+        'password', 'email', 'recipes_count', 'followers_count'
+    }
+    # Остальные поля читаются из базы при обращении.
+    assert cached_user.check_password('Pa55word!')
+    assert cached_user.email == user.email
+
+
+def test_deleted_token_is_rejected_everywhere(shared_cache, user, token):
+    key = token.key
+    authenticate(key)
+    token.delete()
+    with pytest.raises(AuthenticationFailed):
+        authenticate(key)
+
+
+def test_deactivated_user_is_rejected(shared_cache, user, token):
+    authenticate(token.key)
+    user.is_active = False
+    user.save()
+    with pytest.raises(AuthenticationFailed):
+        authenticate(token.key)
+
+
+def test_login_does_not_invalidate_snapshot(shared_cache, user, token):
+    authenticate(token.key)
+    user.save(update_fields=['last_login'])
+    assert authenticate(token.key)[1] == 0
+
+
+def test_process_local_cache_always_checks_database(user, token):
+    # Отзыв токена в одном воркере не дошёл бы до остальных.
+    assert authenticate(token.key) == (user, 1)
+    assert authenticate(token.key) == (user, 1)
+
+
+def test_logout_revokes_token(shared_cache, user_client):
+    assert user_client.get('/api/users/me/').status_code == 200
+    response = user_client.post('/api/auth/token/logout/')
+    assert response.status_code == 204
+    assert user_client.get('/api/users/me/').status_code == 401
+
+
+def test_profile_is_read_from_database(shared_cache, user, user_client):
+    assert user_client.get('/api/users/me/').json()['email'] == user.email
+    # update() не отправляет сигналов и снимок не сбрасывает.
+    User.objects.filter(pk=user.pk).update(first_name='Изменено')
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.get('/api/users/me/').json()
+    assert response['first_name'] == 'Изменено'
+    assert response['email'] == user.email
+    assert len(context) == 1
@@ -0,0 +1,61 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favorite, Recipe, ShoppingList, ShoppingListTotal
+from .test_shopping_totals import totals
+
+pytestmark = pytest.mark.django_db
+
+BATCH_URLS = {
+    Favorite: '/api/recipes/favorite/batch/',
+    ShoppingList: '/api/recipes/shopping_cart/batch/',
+}
+
+
+def batch(client, method, model, recipes):
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(client, method)(
+            BATCH_URLS[model], {'recipes': [recipe.id for recipe in recipes]},
+            format='json'
+        )
+    assert response.status_code == 200
+    return response.json()['results'], len(context)
+
+
+@pytest.mark.parametrize('model', (Favorite, ShoppingList))
+@pytest.mark.parametrize('method', ('post', 'delete'))
+def test_batch_queries_do_not_grow_with_size(user_client, make_recipes,
+                                             model, method):
+    recipes = make_recipes(12)
+    queries = []
+    for part in (recipes[:2], recipes[2:]):
+        if method == 'delete':
+            batch(user_client, 'post', model, part)
+        queries.append(batch(user_client, method, model, part)[1])
+    assert queries[0] == queries[1]
+
+
+def test_cart_batch_keeps_totals(user, user_client, make_recipes):
+    recipes = make_recipes(6)
+    batch(user_client, 'post', ShoppingList, recipes)
+    results, _ = batch(user_client, 'delete', ShoppingList, recipes[:4])
+    assert {result['status'] for result in results} == {'removed'}
+    assert not ShoppingList.objects.filter(
+        user=user, recipe__in=recipes[:4]
+    ).exists()
+    batched = totals()
+    ShoppingListTotal.objects.rebuild()
+    assert batched == totals()
+
+
+def test_favorite_batch_keeps_counters(user, user_client, make_recipes):
+    recipes = make_recipes(3)
+    batch(user_client, 'post', Favorite, recipes)
+    results, _ = batch(user_client, 'delete', Favorite, recipes[:2])
+    assert [result['status'] for result in results] == ['removed'] * 2
+    assert dict(Recipe.objects.values_list('id', 'favorites_count')) == {
+        recipes[0].id: 0, recipes[1].id: 0, recipes[2].id: 1,
+    }
+    results, _ = batch(user_client, 'delete', Favorite, recipes[:2])
+    assert [result['status'] for result in results] == ['absent'] * 2
@@ -0,0 +1,174 @@
+import random
+import threading
+import time
+
+import pytest
+
+from recipes.indexes import CookableIndex
+
+INGREDIENTS = range(1, 41)
+
+
+def random_recipes(rnd, count):
+    return {
+        recipe_id: frozenset(rnd.sample(INGREDIENTS, rnd.randint(1, 8)))
+        for recipe_id in range(1, count + 1)
+    }
+
+
+@pytest.fixture
+def static_version(monkeypatch):
+    # Индекс строится из данных теста, а не перечитывается из базы.
+    monkeypatch.setattr('recipes.indexes.get_version', lambda name: 1)
+
+
+def load(recipes):
+    index = CookableIndex()
+    index.load(
+        (recipe_id, ingredient_id)
+        for recipe_id, ingredient_ids in recipes.items()
+        for ingredient_id in ingredient_ids
+    )
+    index._version = 1
+    return index
+
+
+def expected_ranking(recipes, available, max_missing):
+    ranked = []
+    for recipe_id, ingredient_ids in recipes.items():
+        hits = len(ingredient_ids & available)
+        missing = len(ingredient_ids) - hits
+        if hits and missing <= max_missing:
+            ranked.append((recipe_id, missing, hits))
+    return sorted(ranked, key=lambda row: (row[1], -sum(row[1:]), -row[0]))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rank_matches_brute_force(static_version, seed):
+    rnd = random.Random(seed)
+    recipes = random_recipes(rnd, 300)
+    index = load(recipes)
+    for _ in range(20):
+        available = set(rnd.sample(INGREDIENTS, rnd.randint(1, 15)))
+        max_missing = rnd.randint(0, 4)
+        ranking = index.rank(available, max_missing)
+        expected = expected_ranking(recipes, available, max_missing)
+        assert len(ranking) == len(expected)
+        assert ranking[:] == expected
+        assert ranking[5:17] == expected[5:17]
+
+
+def test_containing_all(static_version):
+    recipes = random_recipes(random.Random(1), 200)
+    index = load(recipes)
+    required = {3, 7}
+    assert index.containing_all(required) == sorted(
+        recipe_id for recipe_id, ingredient_ids in recipes.items()
+        if required <= ingredient_ids
+    )
+    assert index.containing_all([]) == []
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_apply_matches_rebuild(static_version, seed):
+    rnd = random.Random(seed)
+    recipes = random_recipes(rnd, 200)
+    index = load(recipes)
+    for _ in range(300):
+        recipe_id = rnd.randint(1, 260)
+        ingredient_ids = frozenset(rnd.sample(INGREDIENTS, rnd.randint(0, 8)))
+        index.apply(recipe_id, ingredient_ids)
+        if ingredient_ids:
+            recipes[recipe_id] = ingredient_ids
+        else:
+            recipes.pop(recipe_id, None)
+    rebuilt = load(recipes)
+    for _ in range(20):
+        available = set(rnd.sample(INGREDIENTS, rnd.randint(1, 15)))
+        # После apply новые позиции идут в конец, поэтому порядок
+        # внутри корзины может отличаться, а состав нет.
+        assert sorted(index.rank(available, 3)[:]) == sorted(
+            rebuilt.rank(available, 3)[:]
+        )
+        assert index.containing_all(list(available)[:2]) == (
+            rebuilt.containing_all(list(available)[:2])
+        )
+
+
+def test_rank_is_safe_while_changes_are_applied(static_version):
+    rnd = random.Random(7)
+    index = load(random_recipes(rnd, 2000))
+    errors = []
+    stop = time.monotonic() + 1
+
+    def write(seed):
+        rnd = random.Random(seed)
+        while time.monotonic() < stop:
+            ingredient_ids = rnd.sample(INGREDIENTS, rnd.randint(0, 8))
+            with index._lock:
+                index.apply(rnd.randint(1, 2500), ingredient_ids)
+
+    def read(seed):
+        rnd = random.Random(seed)
+        while time.monotonic() < stop:
+            available = rnd.sample(INGREDIENTS, 10)
+            try:
+                page = index.rank(available, 3)[:30]
+                index.containing_all(available[:2])
+            except Exception as error:
+                errors.append(error)
+                return
+            if any(recipe_id == 0 for recipe_id, _, _ in page):
+                errors.append('удалённый рецепт на странице')
+                return
+
+    threads = [
+        threading.Thread(target=target, args=(seed,))
+        for seed, target in enumerate((write, write, read, read, read))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cookable_endpoint_follows_recipe_changes(
+    user_client, make_recipes, ingredients, tags, author
+):
+    # Первый рецепт из трёх ингредиентов, во втором есть четвёртый.
+    cookable, partial = make_recipes(2)
+    available = ','.join(str(ingredient.id) for ingredient in ingredients[:3])
+
+    def ranked():
+        response = user_client.get(
+            '/api/recipes/cookable/', {'ingredients': available}
+        )
+        assert response.status_code == 200
+        return [
+            (recipe['id'], recipe['missing_ingredients'])
+            for recipe in response.json()['results']
+        ]
+
+    assert ranked() == [(cookable.id, 0), (partial.id, 1)]
+
+    author_client = user_client.__class__()
+    author_client.force_authenticate(author)
+    response = author_client.patch(
+        f'/api/recipes/{cookable.id}/',
+        {
+            'ingredients': [
+                {'id': ingredients[0].id, 'amount': 10},
+                {'id': ingredients[5].id, 'amount': 10},
+            ],
+            'tags': [tag.id for tag in tags],
+        },
+        format='json'
+    )
+    assert response.status_code == 200
+    assert ranked() == [(partial.id, 1), (cookable.id, 1)]
+
+    response = author_client.delete(f'/api/recipes/{partial.id}/')
+    assert response.status_code == 204
+    assert ranked() == [(cookable.id, 1)]
@@ -0,0 +1,81 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, Timeline
+from users.models import Follow
+from .conftest import make_user
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def authors(settings, user, user_client, make_recipes):
+    # Лёгкий автор раскладывается по лентам, тяжёлый подмешивается
+    # при чтении.
+    settings.FEED_FANOUT_LIMIT = 1
+    light, heavy = make_user('light'), make_user('heavy')
+    Follow.objects.create(user=make_user('fan'), author=heavy)
+    for author in (light, heavy):
+        assert user_client.post(
+            f'/api/users/{author.id}/subscribe/'
+        ).status_code == 201
+    for number in range(3):
+        make_recipes(1, author=light)
+        make_recipes(1, author=heavy)
+    make_recipes(2)
+    return light, heavy
+
+
+def walk(client, params):
+    ids, queries = [], []
+    url, data = '/api/recipes/feed/', params
+    while url:
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, data).json()
+        queries.append(len(context))
+        assert set(response) == {'next', 'results'}
+        ids.extend(recipe['id'] for recipe in response['results'])
+        url, data = response['next'], None
+    return ids, queries
+
+
+def expected_feed(*authors):
+    return list(Recipe.objects.filter(
+        author__in=authors
+    ).order_by('-pub_date', '-id').values_list('id', flat=True))
+
+
+def test_feed_merges_timeline_and_heavy_authors(user, user_client, authors):
+    light, heavy = authors
+    assert set(Timeline.objects.filter(
+        user=user
+    ).values_list('author_id', flat=True)) == {light.id}
+    ids, queries = walk(user_client, {'limit': 2})
+    assert ids == expected_feed(light, heavy)
+    assert len(set(queries[:-1])) == 1
+
+
+def test_feed_applies_filters(user_client, authors, tags):
+    light, heavy = authors
+    Recipe.objects.get(pk=expected_feed(light, heavy)[0]).tags.clear()
+    ids, _ = walk(user_client, {'limit': 4, 'tags': tags[0].slug})
+    assert ids == expected_feed(light, heavy)[1:]
+
+
+def test_timeline_copies_publication_date(user, authors):
+    light, _ = authors
+    for entry in Timeline.objects.filter(user=user).select_related('recipe'):
+        assert entry.pub_date == entry.recipe.pub_date
+
+
+def test_author_turned_heavy_is_not_repeated(settings, user_client, authors):
+    light, heavy = authors
+    settings.FEED_FANOUT_LIMIT = 0
+    ids, _ = walk(user_client, {'limit': 2})
+    assert ids == expected_feed(light, heavy)
+
+
+def test_invalid_cursor_is_rejected(user_client, authors):
+    response = user_client.get('/api/recipes/feed/', {'cursor': 'abc'})
+    assert response.status_code == 404
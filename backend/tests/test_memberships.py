@@ -0,0 +1,131 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.memberships import (EMPTY_MEMBERSHIPS, get_memberships,
+                                 load_memberships)
+from recipes.models import Favorite, ShoppingList
+from users.models import Follow
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+class Request:
+
+    def __init__(self, user):
+        self.user = user
+
+
+def count_queries(func, *args):
+    with CaptureQueriesContext(connection) as context:
+        result = func(*args)
+    return result, len(context)
+
+
+def test_anonymous_user_has_no_memberships():
+    assert get_memberships(Request(AnonymousUser())) is EMPTY_MEMBERSHIPS
+    assert get_memberships(None) is EMPTY_MEMBERSHIPS
+
+
+def test_memberships_are_cached_per_request(user, make_recipes):
+    recipe, = make_recipes(1)
+    Favorite.objects.create(user=user, recipe=recipe)
+    request = Request(user)
+    memberships, queries = count_queries(get_memberships, request)
+    assert queries == 3
+    assert memberships.favorites == {recipe.id}
+    assert count_queries(get_memberships, request) == (memberships, 0)
+
+
+def test_shared_cache_is_invalidated_on_change(
+    shared_cache, user, author, make_recipes
+):
+    first, second = make_recipes(2)
+    memberships, queries = count_queries(load_memberships, user.id)
+    assert queries == 3
+    assert not memberships.favorites
+    assert count_queries(load_memberships, user.id)[1] == 0
+
+    Favorite.objects.create(user=user, recipe=first)
+    ShoppingList.objects.create(user=user, recipe=second)
+    Follow.objects.create(user=user, author=author)
+    memberships = load_memberships(user.id)
+    assert memberships.favorites == {first.id}
+    assert memberships.shopping_cart == {second.id}
+    assert memberships.following == {author.id}
+
+    Favorite.objects.filter(user=user).delete()
+    assert load_memberships(user.id).favorites == frozenset()
+
+
+def test_process_local_cache_is_bypassed(user, make_recipes):
+    # Кэш в памяти процесса не узнал бы об изменениях в других
+    # воркерах, поэтому множества каждый раз читаются из базы.
+    recipe, = make_recipes(1)
+    assert count_queries(load_memberships, user.id)[1] == 3
+    Favorite.objects.create(user=user, recipe=recipe)
+    memberships, queries = count_queries(load_memberships, user.id)
+    assert queries == 3
+    assert memberships.favorites == {recipe.id}
+
+
+def test_recipe_flags_follow_batch_changes(
+    shared_cache, user_client, make_recipes
+):
+    recipes = make_recipes(3)
+    ids = [recipe.id for recipe in recipes]
+
+    def flags():
+        response = user_client.get('/api/recipes/')
+        return {
+            recipe['id']: (recipe['is_favorited'],
+                           recipe['is_in_shopping_cart'])
+            for recipe in response.json()['results']
+        }
+
+    assert set(flags().values()) == {(False, False)}
+    response = user_client.post(
+        '/api/recipes/favorite/batch/', {'recipes': ids[:2]}, format='json'
+    )
+    assert response.status_code == 200
+    response = user_client.post(
+        f'/api/recipes/{ids[2]}/shopping_cart/'
+    )
+    assert response.status_code == 201
+    assert flags() == {
+        ids[0]: (True, False),
+        ids[1]: (True, False),
+        ids[2]: (False, True),
+    }
+    response = user_client.delete(
+        '/api/recipes/favorite/batch/', {'recipes': ids[:1]}, format='json'
+    )
+    assert response.status_code == 200
+    assert flags()[ids[0]] == (False, False)
+
+
+@pytest.mark.parametrize('param, model', (
+    ('is_favorited', Favorite), ('is_in_shopping_cart', ShoppingList),
+))
+def test_membership_filters_use_subquery(user, user_client, make_recipes,
+                                         param, model):
+    recipes = make_recipes(4)
+    model.objects.bulk_create(
+        [model(user=user, recipe=recipe) for recipe in recipes[:3]]
+    )
+
+    def filtered(value):
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.get('/api/recipes/', {param: value})
+        # Фильтр проверяется подзапросом, а не списком id из кэша.
+        assert any(
+            query['sql'].startswith('SELECT')
+            and f'EXISTS(SELECT (1) AS "a" FROM "{model._meta.db_table}"'
+            in query['sql']
+            for query in context
+        )
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    assert filtered(1) == {recipe.id for recipe in recipes[:3]}
+    assert filtered(0) == {recipes[3].id}
@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from api import offload
+from foodgram.asgi import thread_per_request
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='offload')
+    monkeypatch.setattr(offload, 'executor', pool)
+    yield pool
+    pool.shutdown()
+
+
+def current_thread():
+    return threading.current_thread().name
+
+
+def test_offload_runs_inline_without_executor(monkeypatch):
+    monkeypatch.setattr(offload, 'executor', None)
+    assert offload.offload(current_thread) == current_thread()
+
+
+def test_offload_runs_in_pool_with_context(executor):
+    request_id.set('42')
+    name, value = offload.offload(
+        lambda: (current_thread(), request_id.get())
+    )
+    assert name.startswith('offload')
+    assert value == '42'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_offload_closes_connections_of_pool_thread(executor):
+    def query():
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return connections['default']
+
+    pool_connection = offload.offload(query)
+    assert pool_connection is not connections['default']
+    assert pool_connection.connection is None
+
+
+@pytest.mark.parametrize('threshold', (1, 100))
+def test_offloaded_list_matches_inline(executor, settings, threshold,
+                                       user_client, make_recipes):
+    make_recipes(6)
+    settings.OFFLOAD_LIST_THRESHOLD = 1000
+    expected = user_client.get('/api/recipes/').json()
+    # Поток пула не видит данных тестовой транзакции, поэтому
+    # совпадение ответов значит, что сериализация не ходит в базу.
+    settings.OFFLOAD_LIST_THRESHOLD = threshold
+    assert user_client.get('/api/recipes/').json() == expected
+
+
+def run_concurrently(application, scopes):
+    async def receive():
+        return {'type': 'http.request'}
+
+    async def send(message):
+        pass
+
+    async def main():
+        await asyncio.gather(*(
+            application(scope, receive, send) for scope in scopes
+        ))
+
+    asyncio.run(main())
+
+
+def test_thread_per_request_limits_concurrency():
+    active = 0
+    peak = 0
+    threads = set()
+
+    def view():
+        threads.add(threading.get_ident())
+
+    async def application(scope, receive, send):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        await sync_to_async(view)()
+        active -= 1
+
+    run_concurrently(
+        thread_per_request(application, 2), [{'type': 'http'}] * 6
+    )
+    assert peak == 2
+    assert len(threads) > 1
+
+
+def test_thread_per_request_passes_other_scopes():
+    scopes = []
+
+    async def application(scope, receive, send):
+        scopes.append(scope['type'])
+
+    run_concurrently(
+        thread_per_request(application, 1),
+        [{'type': 'lifespan'}, {'type': 'http'}],
+    )
+    assert sorted(scopes) == ['http', 'lifespan']
@@ -0,0 +1,85 @@
+import pytest
+
+from recipes.models import Recipe, Tag
+
+pytestmark = pytest.mark.django_db
+
+
+def walk(client, url, params):
+    ids = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        ids.extend(item['id'] for item in data['results'])
+        if not data['next']:
+            return ids
+        response = client.get(data['next'])
+
+
+def test_first_cursor_page_uses_empty_cursor(anonymous_client, make_recipes):
+    make_recipes(5)
+    ids = walk(anonymous_client, '/api/recipes/', {'cursor': '', 'limit': 2})
+    assert ids == list(Recipe.objects.order_by(
+        '-pub_date', '-id'
+    ).values_list('id', flat=True))
+
+
+@pytest.mark.parametrize('params, status', (
+    ({'ordering': '-pub_date'}, 200),
+    ({'ordering': 'favorites_count'}, 400),
+    ({'ordering': 'pub_date'}, 400),
+    ({'search': 'рецепт'}, 400),
+))
+def test_cursor_rejects_other_orderings(anonymous_client, make_recipes,
+                                        params, status):
+    make_recipes(2)
+    response = anonymous_client.get(
+        '/api/recipes/', {'cursor': '', **params}
+    )
+    assert response.status_code == status
+    if status == 400:
+        assert 'cursor' in response.json()
+
+
+@pytest.mark.parametrize('ordering, status', (
+    ('username', 200),
+    ('-followers_count', 400),
+))
+def test_subscriptions_cursor_orderings(user_client, author, ordering,
+                                        status):
+    user_client.post(f'/api/users/{author.id}/subscribe/')
+    response = user_client.get(
+        '/api/users/subscriptions/', {'cursor': '', 'ordering': ordering}
+    )
+    assert response.status_code == status
+
+
+def test_page_numbers_keep_other_orderings(anonymous_client, make_recipes):
+    make_recipes(2)
+    response = anonymous_client.get(
+        '/api/recipes/', {'ordering': 'favorites_count'}
+    )
+    assert response.json()['count'] == 2
+
+
+def recipes_count(client, **params):
+    return client.get('/api/recipes/', params).json()['count']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cached_count_follows_tag_changes(anonymous_client, make_recipes,
+                                          tags):
+    recipe, _ = make_recipes(2)
+    dinner = Tag.objects.create(name='Ужин', color='#8775D2', slug='dinner')
+    assert recipes_count(anonymous_client, tags='dinner') == 0
+    recipe.tags.add(dinner)
+    assert recipes_count(anonymous_client, tags='dinner') == 1
+    assert recipes_count(anonymous_client, tags='breakfast') == 2
+    # Тэги меняются местами: по тому же slug находятся другие рецепты.
+    breakfast = tags[0]
+    breakfast.slug = 'morning'
+    breakfast.save()
+    dinner.slug = 'breakfast'
+    dinner.save()
+    assert recipes_count(anonymous_client, tags='breakfast') == 1
@@ -0,0 +1,179 @@
+import threading
+
+import pytest
+from django.db import OperationalError, connections
+
+from foodgram.db import pool
+from foodgram.db.postgresql.base import DatabaseWrapper
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(size=2, timeout=0.05, max_lifetime=None):
+    return pool.ConnectionPool(
+        size, timeout, max_lifetime, pool.ConnectionStats()
+    )
+
+
+def accept(connection):
+    return True
+
+
+def reject(connection):
+    return False
+
+
+def test_idle_connection_is_reused_last_in_first_out():
+    connections_pool = make_pool()
+    first = connections_pool.acquire(FakeConnection, accept)
+    second = connections_pool.acquire(FakeConnection, accept)
+    connections_pool.release(first, True)
+    connections_pool.release(second, True)
+    assert connections_pool.acquire(FakeConnection, accept) is second
+    assert connections_pool.as_dict() == {
+        'open': 2, 'created': 2, 'reused': 1, 'health_check_failures': 0,
+        'timeouts': 0, 'wait_ms': pytest.approx(0, abs=5),
+        'size': 2, 'in_use': 1, 'idle': 1, 'waiting': 0,
+    }
+
+
+def test_exhausted_pool_times_out():
+    connections_pool = make_pool(size=1)
+    connections_pool.acquire(FakeConnection, accept)
+    with pytest.raises(pool.PoolTimeout):
+        connections_pool.acquire(FakeConnection, accept)
+    assert connections_pool.stats.timeouts == 1
+
+
+def test_released_connection_wakes_waiting_thread():
+    connections_pool = make_pool(size=1, timeout=5)
+    connection = connections_pool.acquire(FakeConnection, accept)
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(
+        connections_pool.acquire(FakeConnection, accept)
+    ))
+    waiter.start()
+    connections_pool.release(connection, True)
+    waiter.join(5)
+    assert acquired == [connection]
+
+
+def test_failed_health_check_replaces_connection():
+    connections_pool = make_pool()
+    connection = connections_pool.acquire(FakeConnection, accept)
+    connections_pool.release(connection, True)
+    replacement = connections_pool.acquire(FakeConnection, reject)
+    assert replacement is not connection
+    assert connection.closed
+    assert connections_pool.stats.health_check_failures == 1
+    assert connections_pool.open == 1
+
+
+def test_expired_connection_is_not_reused():
+    connections_pool = make_pool(max_lifetime=0)
+    connection = connections_pool.acquire(FakeConnection, accept)
+    connections_pool.release(connection, True)
+    assert connection.closed
+    assert connections_pool.as_dict()['idle'] == 0
+
+
+def test_unusable_connection_is_discarded():
+    connections_pool = make_pool()
+    connection = connections_pool.acquire(FakeConnection, accept)
+    connections_pool.release(connection, False)
+    assert connection.closed
+    assert connections_pool.open == 0
+
+
+def test_failed_connect_frees_slot():
+    connections_pool = make_pool(size=1)
+
+    def connect():
+        raise OSError('connection refused')
+
+    with pytest.raises(OSError):
+        connections_pool.acquire(connect, accept)
+    assert connections_pool.acquire(FakeConnection, accept)
+
+
+def test_clear_closes_idle_connections():
+    connections_pool = make_pool()
+    idle = connections_pool.acquire(FakeConnection, accept)
+    in_use = connections_pool.acquire(FakeConnection, accept)
+    connections_pool.release(idle, True)
+    connections_pool.clear()
+    assert idle.closed and not in_use.closed
+    assert connections_pool.as_dict()['in_use'] == 1
+
+
+@pytest.fixture
+def pooled_wrapper(request):
+    if not isinstance(connections['default'], DatabaseWrapper):
+        pytest.skip('Пул проверяется только на PostgreSQL')
+    request.getfixturevalue('transactional_db')
+    alias = 'pooled'
+    wrappers = []
+
+    def make(**options):
+        settings_dict = {
+            **connections['default'].settings_dict,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL_SIZE': 1,
+            'POOL_TIMEOUT': 0.1,
+            **options,
+        }
+        wrapper = DatabaseWrapper(settings_dict, alias)
+        wrappers.append(wrapper)
+        return wrapper
+
+    yield make
+    for wrapper in wrappers:
+        wrapper.close()
+    with pool._registry_lock:
+        connections_pool = pool._pools.pop(alias, None)
+        pool._stats.pop(alias, None)
+    if connections_pool is not None:
+        connections_pool.clear()
+
+
+def backend_pid(wrapper):
+    with wrapper.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+def test_postgresql_connection_returns_to_pool(pooled_wrapper):
+    wrapper = pooled_wrapper()
+    pid = backend_pid(wrapper)
+    wrapper.close_if_unusable_or_obsolete()
+    assert wrapper.connection is None
+    assert backend_pid(wrapper) == pid
+    assert wrapper.pool.as_dict()['reused'] == 1
+
+
+def test_postgresql_pool_is_shared_and_bounded(pooled_wrapper):
+    first, second = pooled_wrapper(), pooled_wrapper()
+    assert first.pool is second.pool
+    backend_pid(first)
+    with pytest.raises(OperationalError):
+        backend_pid(second)
+    first.close()
+    backend_pid(second)
+    assert second.pool.as_dict()['timeouts'] == 1
+
+
+def test_postgresql_terminated_connection_is_replaced(pooled_wrapper):
+    wrapper = pooled_wrapper()
+    pid = backend_pid(wrapper)
+    wrapper.close()
+    with connections['default'].cursor() as cursor:
+        cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+    assert backend_pid(wrapper) != pid
+    assert wrapper.pool.as_dict()['health_check_failures'] == 1
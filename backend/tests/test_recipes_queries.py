@@ -0,0 +1,92 @@
+import pytest
+
+from recipes.models import Favorite, ShoppingList
+from users.models import Follow
+
+# Токен, число рецептов, страница, теги, ингредиенты и множества
+# избранного, корзины и подписок пользователя.
+USER_LIST_QUERIES = 8
+# Фильтр по тегам дополнительно проверяет слаги одним запросом.
+FILTERED_LIST_QUERIES = USER_LIST_QUERIES + 1
+# Число рецептов, страница, теги и ингредиенты.
+ANONYMOUS_LIST_QUERIES = 4
+USER_DETAIL_QUERIES = 7
+ANONYMOUS_DETAIL_QUERIES = 3
+
+PAGE_SIZES = (1, 6, 20)
+
+
+@pytest.fixture
+def recipes(make_recipes, user, author):
+    recipes = make_recipes(20)
+    Favorite.objects.bulk_create(
+        [Favorite(user=user, recipe=recipe) for recipe in recipes[::2]]
+    )
+    ShoppingList.objects.bulk_create(
+        [ShoppingList(user=user, recipe=recipe) for recipe in recipes[::3]]
+    )
+    Follow.objects.create(user=user, author=author)
+    return recipes
+
+
+@pytest.mark.parametrize('limit', PAGE_SIZES)
+def test_user_recipe_list_queries(
+    user_client, recipes, django_assert_num_queries, limit
+):
+    with django_assert_num_queries(USER_LIST_QUERIES):
+        response = user_client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == limit
+    favorited = {recipe.id for recipe in recipes[::2]}
+    for recipe in results:
+        assert recipe['is_favorited'] == (recipe['id'] in favorited)
+        assert recipe['author']['is_subscribed'] is True
+
+
+@pytest.mark.parametrize('limit', PAGE_SIZES)
+def test_anonymous_recipe_list_queries(
+    anonymous_client, recipes, django_assert_num_queries, limit
+):
+    with django_assert_num_queries(ANONYMOUS_LIST_QUERIES):
+        response = anonymous_client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.json()['results']) == limit
+
+
+@pytest.mark.parametrize('limit', PAGE_SIZES)
+def test_filtered_recipe_list_queries(
+    user_client, recipes, tags, django_assert_num_queries, limit
+):
+    with django_assert_num_queries(FILTERED_LIST_QUERIES):
+        response = user_client.get('/api/recipes/', {
+            'limit': limit, 'is_favorited': 1, 'tags': tags[0].slug,
+        })
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == min(limit, len(recipes[::2]))
+    assert all(recipe['is_favorited'] for recipe in results)
+
+
+@pytest.mark.parametrize('position', (0, 1, 2))
+def test_user_recipe_detail_queries(
+    user_client, recipes, django_assert_num_queries, position
+):
+    recipe = recipes[position]
+    with django_assert_num_queries(USER_DETAIL_QUERIES):
+        response = user_client.get(f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data['ingredients']) == recipe.recipe_ingredients.count()
+    assert len(data['tags']) == 2
+
+
+@pytest.mark.parametrize('position', (0, 1, 2))
+def test_anonymous_recipe_detail_queries(
+    anonymous_client, recipes, django_assert_num_queries, position
+):
+    recipe = recipes[position]
+    with django_assert_num_queries(ANONYMOUS_DETAIL_QUERIES):
+        response = anonymous_client.get(f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 200
+    assert response.json()['is_favorited'] is False
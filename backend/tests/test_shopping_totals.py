@@ -0,0 +1,101 @@
+import pytest
+
+from recipes.models import Recipe, ShoppingList, ShoppingListTotal
+
+from .conftest import make_user
+
+pytestmark = pytest.mark.django_db
+
+
+def totals():
+    return sorted(ShoppingListTotal.objects.values_list(
+        'user_id', 'ingredient_id', 'amount'
+    ))
+
+
+@pytest.fixture
+def carts(user, make_recipes):
+    other = make_user('other')
+    recipes = make_recipes(4)
+    ShoppingList.objects.bulk_create(
+        [ShoppingList(user=user, recipe=recipe) for recipe in recipes]
+        + [ShoppingList(user=other, recipe=recipe) for recipe in recipes[1:]]
+    )
+    return user, other
+
+
+def test_rebuild_for_users_matches_full_rebuild(carts):
+    user, other = carts
+    ShoppingListTotal.objects.rebuild()
+    expected = totals()
+    ShoppingListTotal.objects.rebuild([user.id])
+    assert totals() == expected
+    ShoppingListTotal.objects.rebuild([user.id, other.id])
+    assert totals() == expected
+
+
+def test_add_recipes_updates_totals_in_one_query(user, carts, make_recipes,
+                                                 django_assert_num_queries):
+    ShoppingListTotal.objects.rebuild()
+    before = totals()
+    recipes = make_recipes(3)
+    ShoppingList.objects.bulk_create(
+        [ShoppingList(user=user, recipe=recipe) for recipe in recipes]
+    )
+    recipe_ids = [recipe.id for recipe in recipes]
+    # Чтение ингредиентов, вставка новых строк и один UPDATE.
+    with django_assert_num_queries(3):
+        ShoppingListTotal.objects.add_recipes(user.id, recipe_ids)
+    added = totals()
+    ShoppingListTotal.objects.rebuild()
+    assert totals() == added
+    # Чтение ингредиентов, один UPDATE и удаление обнулённых строк.
+    with django_assert_num_queries(3):
+        ShoppingListTotal.objects.add_recipes(user.id, recipe_ids, sign=-1)
+    assert totals() == before
+
+
+@pytest.fixture
+def staff_client(client):
+    staff = make_user('staff')
+    staff.is_staff = staff.is_superuser = True
+    staff.save()
+    client.force_login(staff)
+    return client
+
+
+def test_admin_ingredient_edit_updates_totals(staff_client, carts, tags,
+                                              ingredients):
+    ShoppingListTotal.objects.rebuild()
+    recipe = Recipe.objects.get(name='Рецепт 1')
+    rows = list(recipe.recipe_ingredients.order_by('id'))
+    data = {
+        'author': recipe.author_id,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'tags': [tag.id for tag in tags],
+        'recipe_ingredients-TOTAL_FORMS': len(rows) + 1,
+        'recipe_ingredients-INITIAL_FORMS': len(rows),
+        'recipe_ingredients-MIN_NUM_FORMS': 1,
+        'recipe_ingredients-MAX_NUM_FORMS': 1000,
+        f'recipe_ingredients-{len(rows)}-recipe': recipe.id,
+        f'recipe_ingredients-{len(rows)}-ingredient': ingredients[5].id,
+        f'recipe_ingredients-{len(rows)}-amount': 50,
+    }
+    for number, row in enumerate(rows):
+        data.update({
+            f'recipe_ingredients-{number}-id': row.id,
+            f'recipe_ingredients-{number}-recipe': recipe.id,
+            f'recipe_ingredients-{number}-ingredient': row.ingredient_id,
+            f'recipe_ingredients-{number}-amount': 150,
+        })
+    data['recipe_ingredients-1-DELETE'] = 'on'
+    response = staff_client.post(
+        f'/admin/recipes/recipe/{recipe.id}/change/', data
+    )
+    assert response.status_code == 302
+    assert recipe.recipe_ingredients.count() == len(rows)
+    edited = totals()
+    ShoppingListTotal.objects.rebuild()
+    assert edited == totals()
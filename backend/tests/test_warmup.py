@@ -0,0 +1,69 @@
+import logging
+import runpy
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, connections
+
+from api.snapshots import tags_snapshot
+from foodgram import warmup
+
+GUNICORN_CONF = Path(__file__).resolve().parent.parent / 'gunicorn.conf.py'
+
+
+def assert_connections_closed():
+    assert all(
+        connection.connection is None for connection in connections.all()
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_warm_up_closes_connections(tags):
+    assert warmup.warm_up() > 0
+    assert_connections_closed()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_warm_up_tolerates_missing_database(monkeypatch, caplog):
+    def fail():
+        raise OperationalError('relation "recipes_tag" does not exist')
+
+    monkeypatch.setattr(tags_snapshot, 'get', fail)
+    with caplog.at_level(logging.WARNING, logger=warmup.__name__):
+        warmup.warm_up()
+    assert 'Прогрев каталогов пропущен' in caplog.text
+    assert_connections_closed()
+
+
+def test_first_request_is_logged_once(caplog):
+    timer = warmup.track_first_request()
+    with caplog.at_level(logging.INFO, logger=warmup.__name__):
+        for _ in range(2):
+            request_started.send(sender=None)
+            request_finished.send(sender=None)
+    assert caplog.text.count('Первый запрос процесса') == 1
+    assert timer.reported
+    assert not request_started.disconnect(timer.start)
+    assert not request_finished.disconnect(timer.finish)
+
+
+def gunicorn_server(num_workers):
+    return SimpleNamespace(
+        num_workers=num_workers,
+        cfg=SimpleNamespace(preload_app=False),
+        log=logging.getLogger('gunicorn.error'),
+    )
+
+
+def test_several_workers_need_shared_cache():
+    config = runpy.run_path(str(GUNICORN_CONF))
+    config['when_ready'](gunicorn_server(1))
+    with pytest.raises(RuntimeError):
+        config['when_ready'](gunicorn_server(2))
+
+
+def test_shared_cache_allows_several_workers(shared_cache):
+    config = runpy.run_path(str(GUNICORN_CONF))
+    config['when_ready'](gunicorn_server(2))
@@ -15,7 +15,14 @@ class UserChangeForm(forms.ModelForm):
 
 class ProfileAdmin(UserAdmin):
     form = UserChangeForm
-    list_display = ('email', 'username', 'first_name', 'last_name')
+    list_display = (
+        'email',
+        'username',
+        'first_name',
+        'last_name',
+        'recipes_count',
+        'followers_count'
+    )
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal info', {'fields': ('username', 'first_name', 'last_name')}),
@@ -0,0 +1,57 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from recipes.memberships import memberships_changed
+from recipes.versions import bump_version_on_commit
+from .models import Follow, User
+
+# Поля автора, которые попадают в ответы с рецептами.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    if created:
+        memberships_changed(instance.user_id)
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1
+        )
+        # Число подписчиков автора выводится в ответах с рецептами.
+        bump_version_on_commit('catalog')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    memberships_changed(instance.user_id)
+    User.objects.filter(pk=instance.author_id).update(
+        followers_count=Greatest(F('followers_count') - 1, 0)
+    )
+    bump_version_on_commit('catalog')
+
+
+@receiver(pre_save, sender=User)
+def profile_changing(instance, update_fields, **kwargs):
+    # Регистрация, вход и смена пароля на ответы с рецептами не влияют.
+    # Наличие рецептов проверяется в базе: счётчик у экземпляра может
+    # быть устаревшим.
+    instance._author_changed = False
+    fields = [
+        field for field in AUTHOR_FIELDS
+        if update_fields is None or field in update_fields
+    ]
+    if instance.pk is None or not fields:
+        return
+    current = User.objects.filter(
+        pk=instance.pk, recipes__isnull=False
+    ).values(*fields).first()
+    instance._author_changed = current is not None and any(
+        current[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(post_save, sender=User)
+def profile_changed(instance, **kwargs):
+    if instance._author_changed:
+        bump_version_on_commit('catalog')